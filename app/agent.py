@@ -1,12 +1,22 @@
 import json
 import logging
 import re
+import time
 from collections.abc import AsyncIterator
 from typing import Any
 
 import httpx
 
+from .metrics import (
+    model_duration,
+    model_endpoint_label,
+    model_name_label,
+    model_requests,
+    outcome,
+)
 from .registry import registry
+from .serialization import encoded
+from .tracing import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -130,138 +140,177 @@ class AgentLoop:
             {"role": "user", "content": prompt},
         ]
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            for turn_num in range(1, max_turns + 1):
-                # Force tool use on first turn so model doesn't skip
-                force_tool = turn_num == 1
+        trajectory = tracer.start_span(
+            "trajectory", model=self.model, endpoint=self.base_url, max_turns=max_turns
+        )
+        error: BaseException | None = None
+        try:
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                for turn_num in range(1, max_turns + 1):
+                    # The turn span must close before yielding (see app.tracing)
+                    with tracer.span("turn", parent=trajectory, turn=turn_num):
+                        turn, final = await self._run_turn(
+                            client, messages, tools, name_map, turn_num, temperature
+                        )
+                    yield turn
+                    if final:
+                        break
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tracer.end_span(trajectory, error)
+
+    async def _run_turn(
+        self,
+        client: httpx.AsyncClient,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        name_map: dict[str, tuple[str, str]],
+        turn_num: int,
+        temperature: float,
+    ) -> tuple[dict[str, Any], bool]:
+        """One model call plus its tool calls. Returns (turn, is_final)."""
+        # Force tool use on first turn so model doesn't skip
+        force_tool = turn_num == 1
+
+        try:
+            response = await self._call_model(
+                client, messages, tools, temperature,
+                tool_choice="required" if force_tool else "auto",
+            )
+        except Exception as e:
+            logger.exception("Model API call failed on turn %d", turn_num)
+            return {
+                "turn": turn_num,
+                "reasoning": f"API call failed: {e}",
+                "message": f"Error calling model: {e}",
+                "tool_calls": [],
+            }, True
+
+        choice = response["choices"][0]
+        msg = choice["message"]
+
+        content = msg.get("content") or ""
+
+        # Check for model-native thinking fields first
+        native_reasoning = (
+            msg.get("reasoning_content")
+            or msg.get("thinking")
+            or ""
+        )
 
-                try:
-                    response = await self._call_model(
-                        client, messages, tools, temperature,
-                        tool_choice="required" if force_tool else "auto",
-                    )
-                except Exception as e:
-                    logger.exception("Model API call failed on turn %d", turn_num)
-                    yield {
-                        "turn": turn_num,
-                        "reasoning": f"API call failed: {e}",
-                        "message": f"Error calling model: {e}",
-                        "tool_calls": [],
-                    }
-                    break
-
-                choice = response["choices"][0]
-                msg = choice["message"]
-
-                content = msg.get("content") or ""
-
-                # Check for model-native thinking fields first
-                native_reasoning = (
-                    msg.get("reasoning_content")
-                    or msg.get("thinking")
-                    or ""
-                )
+        tool_calls_raw = msg.get("tool_calls") or []
 
-                tool_calls_raw = msg.get("tool_calls") or []
-
-                # Parse [REASONING] and [MESSAGE] from content
-                if native_reasoning:
-                    # Model has separate thinking — content is the message
-                    reasoning = native_reasoning
-                    message = content
-                else:
-                    # Parse from structured content
-                    reasoning, message = _parse_sections(content)
-
-                if not tool_calls_raw:
-                    # Final answer turn
-                    yield {
-                        "turn": turn_num,
-                        "reasoning": reasoning,
-                        "message": message or content,
-                        "tool_calls": [],
-                    }
-                    break
-
-                # Process tool calls
-                turn_tool_calls: list[dict[str, Any]] = []
-
-                assistant_msg: dict[str, Any] = {
-                    "role": "assistant",
-                    "tool_calls": msg["tool_calls"],
-                }
-                if content:
-                    assistant_msg["content"] = content
-                messages.append(assistant_msg)
-
-                for tc in tool_calls_raw:
-                    func = tc["function"]
-                    raw_name = func["name"]
-
-                    if raw_name in name_map:
-                        server_name, tool_name = name_map[raw_name]
-                    elif _SEP in raw_name:
-                        server_name, tool_name = raw_name.split(_SEP, 1)
-                    elif "." in raw_name:
-                        server_name, tool_name = raw_name.split(".", 1)
-                    else:
-                        server_name, tool_name = self._fuzzy_resolve(
-                            raw_name, name_map
-                        )
+        # Parse [REASONING] and [MESSAGE] from content
+        if native_reasoning:
+            # Model has separate thinking — content is the message
+            reasoning = native_reasoning
+            message = content
+        else:
+            # Parse from structured content
+            reasoning, message = _parse_sections(content)
+
+        if not tool_calls_raw:
+            # Final answer turn
+            return {
+                "turn": turn_num,
+                "reasoning": reasoning,
+                "message": message or content,
+                "tool_calls": [],
+            }, True
+
+        # Process tool calls
+        turn_tool_calls: list[dict[str, Any]] = []
+
+        assistant_msg: dict[str, Any] = {
+            "role": "assistant",
+            "tool_calls": msg["tool_calls"],
+        }
+        if content:
+            assistant_msg["content"] = content
+        messages.append(assistant_msg)
+
+        for tc in tool_calls_raw:
+            func = tc["function"]
+            raw_name = func["name"]
+
+            if raw_name in name_map:
+                server_name, tool_name = name_map[raw_name]
+            elif _SEP in raw_name:
+                server_name, tool_name = raw_name.split(_SEP, 1)
+            elif "." in raw_name:
+                server_name, tool_name = raw_name.split(".", 1)
+            else:
+                server_name, tool_name = self._fuzzy_resolve(
+                    raw_name, name_map
+                )
 
-                    try:
-                        arguments = json.loads(func.get("arguments", "{}"))
-                    except (json.JSONDecodeError, TypeError):
-                        arguments = {}
+            try:
+                arguments = json.loads(func.get("arguments", "{}"))
+            except (json.JSONDecodeError, TypeError):
+                arguments = {}
 
-                    try:
-                        result = await registry.execute(
-                            server_name, tool_name, arguments
-                        )
-                        output = {"success": True, "result": result}
-                    except Exception as e:
-                        logger.warning(
-                            "Tool execution failed: %s.%s — %s",
-                            server_name, tool_name, e,
-                        )
-                        output = {"success": False, "error": str(e)}
-
-                    turn_tool_calls.append({
-                        "server": server_name,
-                        "tool": tool_name,
-                        "arguments": arguments,
-                        "output": output,
-                    })
-
-                    # Truncate large outputs before sending back to model
-                    output_str = json.dumps(output)
-                    if len(output_str) > 3000:
-                        output_str = output_str[:3000] + '..."}'
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tc["id"],
-                        "content": output_str,
-                    })
-
-                # Auto-fill reasoning/message if model returned empty
-                if turn_tool_calls:
-                    tool_descs = ", ".join(
-                        f"`{tc['server']}.{tc['tool']}`"
-                        for tc in turn_tool_calls
+            try:
+                result = await registry.execute(
+                    server_name, tool_name, arguments
+                )
+                output = {"success": True, "result": result}
+            except Exception as e:
+                logger.warning(
+                    "Tool execution failed: %s.%s — %s",
+                    server_name, tool_name, e,
+                )
+                output = {"success": False, "error": str(e)}
+            with tracer.span("serialize", tool=f"{server_name}.{tool_name}") as span:
+                try:
+                    output = encoded(output)
+                except (TypeError, ValueError) as e:
+                    # A result that can't be encoded fails this call, not the run
+                    logger.warning(
+                        "Tool output not serializable: %s.%s — %s",
+                        server_name, tool_name, e,
                     )
-                    if not reasoning:
-                        reasoning = (
-                            f"I need to use {tool_descs} to answer the user's question."
-                        )
-                    if not message:
-                        message = f"Let me look that up using {tool_descs}."
+                    output = encoded({"success": False, "error": f"Unserializable result: {e}"})
+                span.set("bytes", len(output.json))
+
+            turn_tool_calls.append({
+                "server": server_name,
+                "tool": tool_name,
+                "arguments": arguments,
+                "output": output,
+            })
 
-                yield {
-                    "turn": turn_num,
-                    "reasoning": reasoning,
-                    "message": message,
-                    "tool_calls": turn_tool_calls,
-                }
+            # Encoded once above; the same bytes are reused when the
+            # turn itself is serialized. Truncate for the model.
+            output_str = output.json.decode("utf-8", "replace")
+            if len(output_str) > 3000:
+                output_str = output_str[:3000] + '..."}'
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tc["id"],
+                "content": output_str,
+            })
+
+        # Auto-fill reasoning/message if model returned empty
+        if turn_tool_calls:
+            tool_descs = ", ".join(
+                f"`{tc['server']}.{tc['tool']}`"
+                for tc in turn_tool_calls
+            )
+            if not reasoning:
+                reasoning = (
+                    f"I need to use {tool_descs} to answer the user's question."
+                )
+            if not message:
+                message = f"Let me look that up using {tool_descs}."
+
+        return {
+            "turn": turn_num,
+            "reasoning": reasoning,
+            "message": message,
+            "tool_calls": turn_tool_calls,
+        }, False
 
     async def generate(
         self,
@@ -316,9 +365,30 @@ class AgentLoop:
             payload["parallel_tool_calls"] = False
 
         logger.info("Sending %d tools, %d messages to %s", len(tools), len(messages), self.model)
-        resp = await client.post(url, json=payload, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+        labels = {
+            "endpoint": model_endpoint_label(httpx.URL(self.base_url).host or "other"),
+            "model": model_name_label(self.model),
+        }
+        started, error = time.perf_counter(), None
+        with tracer.span(
+            "model_call", messages=len(messages), tools=len(tools),
+            endpoint=self.base_url, model=self.model,
+        ) as span:
+            try:
+                resp = await client.post(url, json=payload, headers=headers)
+                resp.raise_for_status()
+                data = resp.json()
+            except BaseException as e:
+                error = e
+                if isinstance(e, httpx.HTTPStatusError):
+                    span.set("http_status", e.response.status_code)
+                raise
+            finally:
+                model_duration.observe(time.perf_counter() - started, **labels)
+                model_requests.inc(status=outcome(error), **labels)
+            span.set("http_status", resp.status_code)
+            span.set("response_bytes", len(resp.content))
+            span.set("finish_reason", data.get("choices", [{}])[0].get("finish_reason", "?"))
         msg = data.get("choices", [{}])[0].get("message", {})
         logger.info(
             "Response: tool_calls=%d, content_len=%d, finish=%s",
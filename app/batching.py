@@ -0,0 +1,119 @@
+"""
+Request coalescing for APIs that can look up many keys in one call.
+
+    async def fetch_papers(ids: list[str]) -> dict[str, dict]:
+        ...  # one request for all ids; missing ids may be left out
+
+    papers = Coalescer(fetch_papers, window=0.05, max_batch=50, cache=cache)
+    paper = await papers.get("2301.07041")          # None if not found
+    found = await papers.get_many(["2301.07041", "1706.03762"])
+
+Keys requested within `window` seconds of each other — from one call or from
+many concurrent tool calls — are fetched together, at most `max_batch` per
+call. A key that is already being fetched is not requested again. With a
+cache (TTLCache or SqliteCache), found values are stored per key and served
+without a call; `ttl(key, value)` can pick a per-entry expiry (None for the
+cache's own).
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+FetchMany = Callable[[list[str]], Awaitable[dict[str, Any]]]
+
+
+class Coalescer:
+    def __init__(
+        self,
+        fetch: FetchMany,
+        window: float = 0.05,
+        max_batch: int = 50,
+        cache: Any = None,
+        ttl: Callable[[str, Any], float | None] | None = None,
+    ) -> None:
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self.cache = cache
+        self.ttl = ttl
+        self.batches = 0  # fetch calls made, for logging and tests
+        self._queued: dict[str, asyncio.Future] = {}
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get(self, key: str) -> Any:
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        """Values for the found keys, in request order; missing keys are omitted."""
+        keys = list(dict.fromkeys(keys))
+        results: dict[str, Any] = {}
+        waiting: dict[str, asyncio.Future] = {}
+        for key in keys:
+            if self.cache is not None:
+                value = self.cache.get(key)
+                if value is not None:
+                    results[key] = value
+                    continue
+            waiting[key] = self._future(key)
+
+        if waiting:
+            # Shielded: a cancelled caller must not cancel a batch others share
+            values = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            results.update(zip(waiting, values))
+        return {k: results[k] for k in keys if results.get(k) is not None}
+
+    def _future(self, key: str) -> asyncio.Future:
+        future = self._in_flight.get(key) or self._queued.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._queued[key] = loop.create_future()
+        if len(self._queued) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queued = self._queued, {}
+        for start in range(0, len(batch), self.max_batch):
+            chunk = dict(list(batch.items())[start:start + self.max_batch])
+            self._in_flight.update(chunk)
+            task = asyncio.create_task(self._run(chunk))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[str, asyncio.Future]) -> None:
+        self.batches += 1
+        logger.debug("Fetching a batch of %d keys", len(batch))
+        try:
+            found = await self.fetch(list(batch))
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # retrieved: no warning if every caller left
+            return
+        finally:
+            for key in batch:
+                self._in_flight.pop(key, None)
+
+        for key, future in batch.items():
+            value = found.get(key)
+            if value is not None and self.cache is not None:
+                self.cache.set(key, value, self.ttl(key, value) if self.ttl else None)
+            if not future.done():
+                future.set_result(value)
@@ -0,0 +1,163 @@
+"""
+Small cache primitives shared by the SDK and tools.
+
+    TTLCache     — bounded in-memory LRU with optional per-entry expiry
+    SqliteCache  — same interface, persisted to a local SQLite file
+
+Values stored in SqliteCache must be JSON-serializable.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from .db import connect
+
+
+class TTLCache:
+    """Bounded LRU cache. Entries expire after `ttl` seconds (None = never)."""
+
+    def __init__(self, max_entries: int = 256, ttl: float | None = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is not None:
+            expires, value = item
+            if expires is None or expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteCache:
+    """Persistent cache in a SQLite file. Several namespaces can share one file,
+    and several processes (app.serve workers) can share one cache."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        namespace: str = "default",
+        max_entries: int = 10_000,
+        ttl: float | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = 0
+
+    def _db(self):
+        """Connection for this process (opened lazily, reopened after fork)."""
+        if self._conn is None or self._pid != os.getpid():
+            conn = connect(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires REAL, stored REAL NOT NULL,"
+                " PRIMARY KEY (ns, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_stored ON entries (ns, stored)"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value, expires FROM entries WHERE ns = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+        if row is not None and (row[1] is None or row[1] > time.time()):
+            self.hits += 1
+            return json.loads(row[0])
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl else None
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO entries (ns, key, value, expires, stored)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), expires, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune()
+            self._db().commit()
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM entries WHERE ns = ? AND key = ?", (self.namespace, key)
+            )
+            self._db().commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM entries WHERE ns = ?", (self.namespace,))
+            self._db().commit()
+
+    def close(self) -> None:
+        """Close this process's connection (reopened if the cache is used again)."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute(
+                "SELECT COUNT(*) FROM entries WHERE ns = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def _prune(self) -> None:
+        """Drop expired rows, then the oldest rows beyond max_entries."""
+        self._db().execute(
+            "DELETE FROM entries WHERE ns = ? AND expires IS NOT NULL AND expires <= ?",
+            (self.namespace, time.time()),
+        )
+        self._db().execute(
+            "DELETE FROM entries WHERE ns = ? AND key IN ("
+            " SELECT key FROM entries WHERE ns = ? ORDER BY stored DESC"
+            " LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        )
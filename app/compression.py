@@ -0,0 +1,140 @@
+"""
+Response compression (gzip, plus brotli when the `brotli` package is installed).
+
+CompressionMiddleware only touches complete responses: a single body chunk,
+or several chunks with a known Content-Length up to MAX_BUFFER (static
+files). Streams (SSE, NDJSON, MCP) pass through untouched so events are not
+held back in a compressor buffer.
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+MIN_SIZE = 1024
+MAX_BUFFER = 4 * 1024 * 1024
+
+# Preference order when the client accepts several with equal weight
+_SUPPORTED = ("br", "gzip") if brotli is not None else ("gzip",)
+
+_SKIP_TYPES = ("text/event-stream", "application/x-ndjson", "image/", "video/", "audio/")
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Best supported encoding for an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in _SUPPORTED:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _content_length(start: dict) -> int | None:
+    for key, value in start.get("headers", []):
+        if key.lower() == b"content-length":
+            return int(value)
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MIN_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict | None = None
+        passthrough = False
+        chunks: list[bytes] = []
+
+        async def wrapped_send(message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if not self._eligible(message):
+                    # Don't hold back the headers of streams
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                if _content_length(start) is not None:
+                    return  # buffer the rest of a bounded response
+                passthrough = True
+                await send(start)
+                await send({**message, "body": b"".join(chunks)})
+                return
+            body = b"".join(chunks)
+            if len(body) < self.minimum_size:
+                await send(start)
+                await send({**message, "body": body})
+                return
+
+            data = compress(body, encoding)
+            response_headers = [
+                (k, v) for k, v in start.get("headers", [])
+                if k.lower() != b"content-length"
+            ]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(data)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, wrapped_send)
+
+    @staticmethod
+    def _eligible(start: dict) -> bool:
+        if start.get("status", 200) in (204, 304):
+            return False
+        length = _content_length(start)
+        if length is not None and length > MAX_BUFFER:
+            return False
+        for key, value in start.get("headers", []):
+            key = key.lower()
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type" and value.decode("latin-1").startswith(_SKIP_TYPES):
+                return False
+        return True
@@ -5,8 +5,44 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     tools_dir: Path = Path("tools")
+    cache_dir: Path = Path(".cache")
+    data_dir: Path = Path("data")
     debug: bool = False
 
+    # Production server (python -m app.serve). With more than one worker,
+    # HTTP caches and rate limits are shared through SQLite files in cache_dir.
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1  # 0 = one per CPU
+    # Seconds a stopping worker waits for in-flight requests and streams
+    shutdown_timeout: float = 30.0
+
+    # Tool calls allowed to run at once per tool server
+    tool_concurrency: int = 16
+    # Upper bound on calls accepted by /tools/execute/batch
+    batch_max_calls: int = 200
+
+    # Background trajectory generation (/tools/agent/jobs)
+    job_workers: int = 2
+
+    # /tools/agent/ws: runs one connection may have going at once, and turns
+    # a run may get ahead of a slow client before it waits
+    ws_max_streams: int = 32
+    ws_stream_buffer: int = 4
+
+    # MCP Streamable HTTP (/mcp/http). Stateless mode keeps no per-client
+    # session, so any worker behind a load balancer can answer any request.
+    mcp_stateless: bool = False
+    mcp_json_response: bool = False
+    # Concurrent tools/call requests a single MCP session may have running
+    # (stateless: a single client, by mcp-session-id header or address)
+    mcp_max_inflight_per_session: int = 4
+
+    # Tracing of agent runs, tool calls and MCP requests: "" (off), "chrome"
+    # (one trace-event file per trace) or "otlp" (OTLP/JSON lines)
+    trace_exporter: str = ""
+    trace_dir: Path = Path("data/traces")
+
     model_config = {"env_file": ".env"}
 
 
@@ -0,0 +1,18 @@
+"""SQLite helpers shared by the local stores (jobs, caches, trajectories)."""
+
+import sqlite3
+from pathlib import Path
+
+
+def connect(path: str | Path) -> sqlite3.Connection:
+    """Open a WAL-mode connection usable from the event loop and worker threads.
+
+    Callers serialize access themselves (a threading.Lock per connection).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,180 @@
+"""
+HTTP cache for outgoing GET requests — an httpx transport wrapper.
+
+Honours Cache-Control (no-store, no-cache, max-age), Expires and the
+ETag / Last-Modified validators. Fresh entries are served without touching
+the network; stale ones are revalidated with If-None-Match /
+If-Modified-Since and a 304 is answered from the local copy.
+
+Entries live in a bounded in-memory LRU, optionally backed by a SqliteCache
+so they survive restarts.
+"""
+
+import base64
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+from .cache import SqliteCache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Heuristic freshness for responses that only carry Last-Modified (RFC 9111 §4.2.2)
+_HEURISTIC_FRACTION = 0.1
+_HEURISTIC_MAX = 24 * 3600
+
+# Hop-by-hop / per-message headers that must not be replayed from the cache
+_DROP_HEADERS = {"transfer-encoding", "connection", "keep-alive", "date", "age"}
+
+
+def _cache_control(headers: httpx.Headers) -> dict[str, str]:
+    directives: dict[str, str] = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _freshness_lifetime(headers: httpx.Headers) -> float:
+    cc = _cache_control(headers)
+    if "no-cache" in cc:
+        return 0.0
+    if "max-age" in cc:
+        try:
+            return max(0.0, float(cc["max-age"]))
+        except ValueError:
+            return 0.0
+    date = _http_date(headers.get("date")) or time.time()
+    expires = _http_date(headers.get("expires"))
+    if expires is not None:
+        return max(0.0, expires - date)
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(_HEURISTIC_MAX, max(0.0, (date - last_modified) * _HEURISTIC_FRACTION))
+    return 0.0
+
+
+class HttpCache:
+    """Two-tier store of cached responses keyed by URL."""
+
+    def __init__(self, max_entries: int = 256, disk: SqliteCache | None = None) -> None:
+        self.memory = TTLCache(max_entries=max_entries)
+        self.disk = disk
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def set(self, key: str, entry: dict[str, Any]) -> None:
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Wraps another transport and answers GETs from an HttpCache when allowed."""
+
+    def __init__(self, cache: HttpCache, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self.cache = cache
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        key = str(request.url)
+        entry = self.cache.get(key)
+        request_cc = _cache_control(request.headers)
+
+        if entry is not None:
+            if "no-cache" not in request_cc and entry["expires"] > time.time():
+                return self._replay(request, entry, "HIT")
+            if entry.get("etag"):
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            entry = self._refresh(entry, response.headers)
+            self.cache.set(key, entry)
+            return self._replay(request, entry, "REVALIDATED")
+
+        if response.status_code != 200 or "no-store" in _cache_control(response.headers):
+            return response
+
+        lifetime = _freshness_lifetime(response.headers)
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if lifetime <= 0 and not etag and not last_modified:
+            return response
+
+        body = b"".join([chunk async for chunk in response.stream])
+        await response.aclose()
+        entry = {
+            "status": response.status_code,
+            "headers": [
+                (k, v) for k, v in response.headers.multi_items()
+                if k.lower() not in _DROP_HEADERS
+            ],
+            "body": base64.b64encode(body).decode("ascii"),
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires": time.time() + lifetime,
+        }
+        self.cache.set(key, entry)
+        return httpx.Response(
+            response.status_code,
+            headers=entry["headers"] + [("X-Cache", "MISS")],
+            content=body,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    # -- helpers ------------------------------------------------------------
+    @staticmethod
+    def _refresh(entry: dict[str, Any], headers: httpx.Headers) -> dict[str, Any]:
+        """Apply the validators and freshness of a 304 to a stored entry."""
+        stored = httpx.Headers(entry["headers"])
+        for name in ("cache-control", "expires", "etag", "last-modified", "vary"):
+            if name in headers:
+                stored[name] = headers[name]
+        return {
+            **entry,
+            "headers": list(stored.multi_items()),
+            "etag": stored.get("etag"),
+            "last_modified": stored.get("last-modified"),
+            "expires": time.time() + _freshness_lifetime(stored),
+        }
+
+    @staticmethod
+    def _replay(request: httpx.Request, entry: dict[str, Any], status: str) -> httpx.Response:
+        logger.debug("HTTP cache %s: %s", status, request.url)
+        return httpx.Response(
+            entry["status"],
+            headers=entry["headers"] + [("X-Cache", status)],
+            content=base64.b64decode(entry["body"]),
+            request=request,
+        )
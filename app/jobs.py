@@ -0,0 +1,329 @@
+"""
+Background trajectory generation backed by SQLite.
+
+Jobs are submitted with the same payload as /tools/agent/generate, run by a
+fixed pool of worker tasks inside the app, and every turn is written to the
+database as soon as it completes. Clients poll or stream a job instead of
+holding one HTTP request open for the whole run. Finished trajectories are
+also added to the trajectory store.
+
+Jobs that were queued or running when the process stopped are re-queued on
+the next start (their partial turns are discarded and the run starts over).
+With several app.serve workers, each job is claimed by exactly one worker
+(recorded by pid). The supervisor re-queues a dead worker's jobs with
+recover(pid), and a cancel sent to another worker is seen at the next turn.
+The stored request includes the caller's API key so that re-queued jobs can
+run; keep the data directory private.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from .agent import AgentLoop
+from .config import settings
+from .db import connect
+from .metrics import generations_in_flight
+from .models import AgentGenerateRequest
+from .serialization import dumps_str
+from .store import store
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = ("done", "failed", "cancelled")
+
+
+class JobManager:
+    def __init__(self, path: str | Path, workers: int = 2) -> None:
+        self.path = Path(path)
+        self.workers = workers
+        self._conn = None
+        self._lock = threading.Lock()
+        self._queue: asyncio.Queue[str] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._running: dict[str, asyncio.Task] = {}
+        self._cancelled: set[str] = set()
+        self._updates: dict[str, asyncio.Event] = {}
+        # app.serve recovers jobs once in the supervisor instead
+        self.recover_on_start = True
+
+    # -- lifecycle ----------------------------------------------------------
+    async def start(self) -> None:
+        self._conn = self._open()
+        if self.recover_on_start:
+            self.recover()
+        with self._lock:
+            pending = [
+                row["id"]
+                for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+                )
+            ]
+
+        self._queue = asyncio.Queue()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        if pending:
+            logger.info("Re-queued %d unfinished jobs", len(pending))
+
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    def recover(self, worker: int | None = None) -> int:
+        """Re-queue running jobs (only those of `worker` if given). Returns the count."""
+        conn = self._conn or self._open()
+        query = (
+            "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ?"
+            " WHERE status = 'running'"
+        )
+        params: list[Any] = [time.time()]
+        if worker is not None:
+            query += " AND worker = ?"
+            params.append(worker)
+        with self._lock, conn:
+            count = conn.execute(query, params).rowcount
+        if conn is not self._conn:
+            conn.close()
+        return count
+
+    def _open(self):
+        conn = connect(self.path)
+        with self._lock, conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    worker INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS job_turns (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    turn TEXT NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                );
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "worker" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+        return conn
+
+    async def stop(self) -> None:
+        """Stop the workers. Running jobs stay 'running' and are re-queued on start."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # -- public API ---------------------------------------------------------
+    def submit(self, request: AgentGenerateRequest) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, request, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, request.model_dump_json(), now, now),
+            )
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, error, created_at, updated_at, started_at,"
+                " finished_at, (SELECT COUNT(*) FROM job_turns WHERE job_id = jobs.id)"
+                " AS turn_count FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(
+        self, status: str | None = None, limit: int = 50, offset: int = 0
+    ) -> list[dict[str, Any]]:
+        query = (
+            "SELECT id, status, error, created_at, updated_at, started_at, finished_at"
+            " FROM jobs"
+        )
+        params: list[Any] = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(query, params)]
+
+    def turns(self, job_id: str, after: int = 0) -> list[dict[str, Any]]:
+        """Turns with index > `after` (turn indexes start at 1)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT turn FROM job_turns WHERE job_id = ? AND idx > ? ORDER BY idx",
+                (job_id, after),
+            ).fetchall()
+        return [json.loads(r["turn"]) for r in rows]
+
+    async def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job["status"] in TERMINAL:
+            return False
+        self._cancelled.add(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        else:
+            self._set_status(job_id, "cancelled", finished=True)
+        return True
+
+    def update_event(self, job_id: str) -> asyncio.Event:
+        """Event set on the next change; grab it *before* reading job state."""
+        return self._updates.setdefault(job_id, asyncio.Event())
+
+    # -- workers ------------------------------------------------------------
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            request = self._claim(job_id)
+            if request is None:
+                continue  # gone, cancelled, or taken by another worker
+
+            task = asyncio.create_task(self._run(job_id, request))
+            self._running[job_id] = task
+            generations_in_flight.inc(mode="job")
+            try:
+                await task
+                if self._set_status(job_id, "done", finished=True):
+                    await asyncio.to_thread(self._save_trajectory, job_id, request)
+            except asyncio.CancelledError:
+                if job_id not in self._cancelled:
+                    # Shutdown: leave it 'running' so start() re-queues it
+                    task.cancel()
+                    raise
+                self._set_status(job_id, "cancelled", finished=True)
+            except httpx.HTTPStatusError as e:
+                logger.exception("Job %s: agent API call failed", job_id)
+                self._set_status(
+                    job_id, "failed", finished=True,
+                    error=f"API error {e.response.status_code}: {e.response.text[:500]}",
+                )
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                self._set_status(job_id, "failed", finished=True, error=str(e))
+            finally:
+                generations_in_flight.dec(mode="job")
+                self._running.pop(job_id, None)
+                self._cancelled.discard(job_id)
+
+    async def _run(self, job_id: str, request: AgentGenerateRequest) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM job_turns WHERE job_id = ?", (job_id,))
+
+        agent = AgentLoop(
+            request.api_key,
+            request.base_url,
+            request.model,
+            system_prompt=request.system_prompt or None,
+        )
+        async for turn in agent.generate_stream(
+            request.prompt, request.max_turns, request.temperature
+        ):
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO job_turns (job_id, idx, turn) VALUES (?, ?, ?)",
+                    (job_id, turn["turn"], dumps_str(turn)),
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id)
+                )
+            self._notify(job_id)
+            if self._status(job_id) == "cancelled":
+                # Cancelled through another worker
+                self._cancelled.add(job_id)
+                raise asyncio.CancelledError
+
+    def _claim(self, job_id: str) -> AgentGenerateRequest | None:
+        """Atomically move a queued job to running for this process."""
+        now = time.time()
+        with self._lock, self._conn:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (os.getpid(), now, now, job_id),
+            ).rowcount
+            row = self._conn.execute(
+                "SELECT request FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if not claimed or row is None:
+            return None
+        self._notify(job_id)
+        return AgentGenerateRequest.model_validate_json(row["request"])
+
+    def _status(self, job_id: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row["status"] if row else None
+
+    def _save_trajectory(self, job_id: str, request: AgentGenerateRequest) -> None:
+        job = self.get(job_id)
+        duration_ms = (job["finished_at"] - job["started_at"]) * 1000
+        store.add(
+            request.prompt,
+            {
+                "id": job_id,
+                "name": request.model,
+                "source": "agent",
+                "model": request.model,
+                "turns": self.turns(job_id),
+            },
+            duration_ms=duration_ms,
+        )
+
+    def _set_status(
+        self,
+        job_id: str,
+        status: str,
+        finished: bool = False,
+        error: str | None = None,
+    ) -> bool:
+        """Update a job that has not finished yet. Returns False if it had."""
+        now = time.time()
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?,"
+                " finished_at = CASE WHEN ? THEN ? ELSE finished_at END"
+                " WHERE id = ? AND status NOT IN ('done', 'failed', 'cancelled')",
+                (status, error, now, finished, now, job_id),
+            ).rowcount
+        self._notify(job_id)
+        return updated > 0
+
+    def _notify(self, job_id: str) -> None:
+        event = self._updates.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+
+jobs = JobManager(settings.data_dir / "jobs.db", workers=settings.job_workers)
@@ -0,0 +1,256 @@
+"""
+Streaming JSONL format for trajectories.
+
+Each line is one JSON object:
+
+    {"type": "trajectory", "prompt": "...", "name": ..., "source": ..., "model": ..., "turns": [...]}
+
+or, at turn granularity, a trajectory header without "turns" followed by one
+line per turn:
+
+    {"type": "trajectory", "prompt": "...", "name": ..., "source": ..., "model": ...}
+    {"type": "turn", "turn": 1, "reasoning": ..., "message": ..., "tool_calls": [...]}
+    {"type": "turn", "turn": 2, ...}
+
+Readers hold at most one trajectory in memory. The legacy export document
+({"prompt": ..., "trajectories": [...]}) can be converted without loading
+it whole:
+
+    python -m app.jsonl convert export.json export.jsonl [--turns]
+"""
+
+import json
+import sys
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from typing import IO, Any
+
+_decoder = json.JSONDecoder()
+
+MAX_LINE = 64 << 20  # bytes; one trajectory per line, so lines can be large
+
+
+# -- writing ----------------------------------------------------------------
+
+def dump_trajectory(
+    trajectory: dict[str, Any], prompt: str | None = None, per_turn: bool = False
+) -> Iterator[str]:
+    """Yield the JSONL lines (with trailing newline) for one trajectory."""
+    header = {"type": "trajectory", **trajectory}
+    header.setdefault("prompt", prompt or "")
+    if not per_turn:
+        yield json.dumps(header, default=str) + "\n"
+        return
+    turns = header.pop("turns", None) or []
+    yield json.dumps(header, default=str) + "\n"
+    for turn in turns:
+        yield json.dumps({"type": "turn", **turn}, default=str) + "\n"
+
+
+# -- reading ----------------------------------------------------------------
+
+class _Assembler:
+    """Turns a sequence of parsed lines back into whole trajectories."""
+
+    def __init__(self) -> None:
+        self.current: dict[str, Any] | None = None
+
+    def feed(self, record: Any, n: int) -> dict[str, Any] | None:
+        """Add line `n`'s record; returns the trajectory it completes, if any."""
+        if not isinstance(record, dict):
+            raise ValueError(f"line {n}: expected an object")
+        kind = record.pop("type", "trajectory")
+        if kind == "turn":
+            if self.current is None:
+                raise ValueError(f"line {n}: turn line before any trajectory line")
+            self.current["turns"].append(record)
+            return None
+        if kind != "trajectory":
+            raise ValueError(f"line {n}: unknown line type {kind!r}")
+        done = self.flush()
+        record.setdefault("turns", [])
+        self.current = record
+        return done
+
+    def flush(self) -> dict[str, Any] | None:
+        done, self.current = self.current, None
+        return done
+
+
+def iter_trajectories(lines: Iterable[str | bytes]) -> Iterator[dict[str, Any]]:
+    """Yield complete trajectories (each with its "prompt") from JSONL lines."""
+    assembler = _Assembler()
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        done = assembler.feed(json.loads(line), n)
+        if done is not None:
+            yield done
+    done = assembler.flush()
+    if done is not None:
+        yield done
+
+
+async def aiter_lines(
+    chunks: AsyncIterable[bytes], max_line: int = MAX_LINE
+) -> AsyncIterator[bytes]:
+    """Split a byte stream (e.g. a request body) into lines.
+
+    Only each new chunk is searched for newlines, so a long line costs linear
+    time however it is chunked. Raises ValueError for a line over `max_line`.
+    """
+    pending = bytearray()
+    async for chunk in chunks:
+        start = 0
+        end = chunk.find(b"\n")
+        while end != -1:
+            pending += chunk[start:end]
+            if len(pending) > max_line:
+                break
+            line = bytes(pending)
+            pending.clear()
+            yield line
+            start = end + 1
+            end = chunk.find(b"\n", start)
+        else:
+            pending += chunk[start:]
+        if len(pending) > max_line:
+            raise ValueError(f"Line longer than {max_line} bytes")
+    if pending:
+        yield bytes(pending)
+
+
+async def aiter_trajectories(lines: AsyncIterable[str | bytes]) -> AsyncIterator[dict[str, Any]]:
+    """Async counterpart of iter_trajectories."""
+    assembler = _Assembler()
+    n = 0
+    async for line in lines:
+        n += 1
+        if not line.strip():
+            continue
+        done = assembler.feed(json.loads(line), n)
+        if done is not None:
+            yield done
+    done = assembler.flush()
+    if done is not None:
+        yield done
+
+
+# -- legacy export documents ------------------------------------------------
+
+class _StreamingDecoder:
+    """Incrementally decodes values from a text file without reading it whole."""
+
+    def __init__(self, fp: IO[str], chunk_size: int = 1 << 16) -> None:
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: int) -> None:
+        data = self.fp.read(size)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos : self.pos + 1]
+            self._fill(self.chunk_size)
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number that ends exactly at the buffer edge may be cut short
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow reads geometrically so a huge value is not re-parsed O(n) times
+            self._fill(size)
+            size *= 2
+
+
+def iter_legacy(fp: IO[str]) -> Iterator[dict[str, Any]]:
+    """Yield trajectories (with "prompt") from a legacy export document.
+
+    Streams the "trajectories" array element by element. Also accepts the
+    older {prompt, turns} document and a bare list of turns.
+    """
+    reader = _StreamingDecoder(fp)
+    first = reader.peek()
+    if first == "[":
+        yield {"prompt": "", "name": "Imported", "source": "import", "turns": reader.value()}
+        return
+
+    reader.expect("{")
+    prompt: str | None = None
+    waiting: list[dict[str, Any]] = []  # trajectories seen before "prompt"
+    single: dict[str, Any] = {}
+
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key == "trajectories":
+            reader.expect("[")
+            while reader.peek() != "]":
+                traj = reader.value()
+                if prompt is None:
+                    waiting.append(traj)
+                else:
+                    yield {**traj, "prompt": prompt}
+                if reader.peek() == ",":
+                    reader.pos += 1
+            reader.pos += 1
+        elif key == "prompt":
+            prompt = reader.value()
+            for traj in waiting:
+                yield {**traj, "prompt": prompt}
+            waiting = []
+        else:
+            single[key] = reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+
+    for traj in waiting:
+        yield {**traj, "prompt": prompt or ""}
+    if "turns" in single:
+        yield {"name": "Imported", "source": "import", **single, "prompt": prompt or ""}
+
+
+def convert(src: IO[str], dst: IO[str], per_turn: bool = False) -> int:
+    """Legacy export document -> JSONL. Returns the number of trajectories."""
+    count = 0
+    for traj in iter_legacy(src):
+        for line in dump_trajectory(traj, per_turn=per_turn):
+            dst.write(line)
+        count += 1
+    return count
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) < 3 or argv[0] != "convert":
+        print(__doc__.strip(), file=sys.stderr)
+        return 2
+    with open(argv[1], encoding="utf-8") as src, open(argv[2], "w", encoding="utf-8") as dst:
+        count = convert(src, dst, per_turn="--turns" in argv[3:])
+    print(f"Wrote {count} trajectories to {argv[2]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,24 +1,35 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
+from .compression import CompressionMiddleware
 from .config import settings
-from .mcp_server import mcp as mcp_server, sse
+from .jobs import jobs
+from .metrics import metrics, monitor_event_loop, sse_streams
+from .mcp_server import mcp as mcp_server, sse, streamable_http
 from .registry import registry
 from .router import router
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-worker metric snapshots under app.serve (see app.metrics)
+METRICS_DIR = settings.cache_dir / "metrics"
+
 
 # -- Raw ASGI sub-app for MCP ----------------------------------------------
 # MCP's SSE transport sends responses directly via scope/receive/send,
 # so we bypass Starlette's endpoint wrapper and use raw ASGI.
 
+# Streamable HTTP session manager for the current lifespan
+_mcp_http = None
+
+
 async def mcp_asgi(scope, receive, send):
     if scope["type"] == "lifespan":
         while True:
@@ -36,12 +47,15 @@ async def mcp_asgi(scope, receive, send):
     path = scope.get("path", "")
 
     if path.endswith("/sse"):
-        async with sse.connect_sse(scope, receive, send) as (read, write):
-            await mcp_server.run(
-                read, write, mcp_server.create_initialization_options()
-            )
+        with sse_streams.track(endpoint="mcp"):
+            async with sse.connect_sse(scope, receive, send) as (read, write):
+                await mcp_server.run(
+                    read, write, mcp_server.create_initialization_options()
+                )
     elif "/messages" in path:
         await sse.handle_post_message(scope, receive, send)
+    elif path.rstrip("/").endswith("/http"):
+        await _mcp_http.handle_request(scope, receive, send)
     else:
         await send({
             "type": "http.response.start",
@@ -55,13 +69,29 @@ async def mcp_asgi(scope, receive, send):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    registry.load_tools(settings.tools_dir)
+    global _mcp_http
+    # Already loaded when app.serve preloaded it before forking
+    registry.ensure_loaded(settings.tools_dir)
     logger.info(
         "Loaded %d tools from %d servers",
         len(registry.list_tools()),
         len(registry.list_servers()),
     )
-    yield
+    await jobs.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop())
+    publisher = (
+        asyncio.create_task(metrics.publish_forever(METRICS_DIR))
+        if settings.workers != 1 else None
+    )
+    _mcp_http = streamable_http()
+    try:
+        async with _mcp_http.run():
+            yield
+    finally:
+        lag_monitor.cancel()
+        if publisher is not None:
+            publisher.cancel()
+        await jobs.stop()
 
 
 app = FastAPI(
@@ -71,6 +101,7 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(CompressionMiddleware)
 app.include_router(router)
 app.mount("/mcp", mcp_asgi)
 
@@ -82,6 +113,16 @@ async def playground():
     return FileResponse(_static / "index.html")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    # With several workers a scrape lands on any one of them: merge them all
+    if settings.workers != 1:
+        body = await asyncio.to_thread(metrics.render_all, METRICS_DIR)
+    else:
+        body = metrics.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health():
     return {
@@ -1,49 +1,248 @@
 """
 MCP Server layer — exposes the same tools/ as an MCP-compatible server.
 
-Clients (Claude, GPT, etc.) connect via SSE at /mcp/sse
-and send tool calls to /mcp/messages/
+Clients (Claude, GPT, etc.) connect either
+  - via SSE at /mcp/sse and send tool calls to /mcp/messages/ (legacy), or
+  - via Streamable HTTP at /mcp/http (optionally stateless, see settings).
 """
 
-import json
+import asyncio
 import logging
+import weakref
+from collections.abc import AsyncIterator
+from contextlib import aclosing, asynccontextmanager
+from typing import Any
 
-from mcp.server import Server
+from mcp.server import NotificationOptions, Server
 from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 import mcp.types as types
 
+from .config import settings
+from .metrics import metrics
 from .registry import registry
+from .serialization import dumps_str
+from .tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 # -- MCP server instance ----------------------------------------------------
 
-mcp = Server("tool-use-mcp")
+class _ToolUseServer(Server):
+    """Advertises tools.listChanged on every transport (SSE, HTTP, stdio)."""
+
+    def create_initialization_options(self, notification_options=None, experimental_capabilities=None):
+        return super().create_initialization_options(
+            notification_options or NotificationOptions(tools_changed=True),
+            experimental_capabilities,
+        )
+
+
+mcp = _ToolUseServer("tool-use-mcp")
 
 # SSE transport — tells clients to POST to /mcp/messages/
 sse = SseServerTransport("/messages/")
 
 
+def streamable_http() -> StreamableHTTPSessionManager:
+    """Streamable HTTP transport, served at /mcp/http.
+
+    A manager can only be run once, so the app creates one per lifespan.
+    """
+    return StreamableHTTPSessionManager(
+        app=mcp,
+        stateless=settings.mcp_stateless,
+        json_response=settings.mcp_json_response,
+    )
+
+
 # -- handlers ---------------------------------------------------------------
 
 @mcp.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
-    return [
-        types.Tool(
-            name=t["full_name"],
-            description=t["description"],
-            inputSchema=t["inputSchema"],
+    with tracer.span("mcp.list_tools"):
+        return _list_tools()
+
+
+def _list_tools() -> list[types.Tool]:
+    registry.ensure_loaded(settings.tools_dir)
+    _track_session()
+    global _tool_list
+    if _tool_list is None or _tool_list[0] != registry.version:
+        _tool_list = (
+            registry.version,
+            [
+                types.Tool(
+                    name=t["full_name"],
+                    description=t["description"],
+                    inputSchema=t["inputSchema"],
+                )
+                for t in registry.list_tools()
+            ],
         )
-        for t in registry.list_tools()
-    ]
+    return _tool_list[1]
 
 
 @mcp.call_tool()
 async def handle_call_tool(
     name: str, arguments: dict | None
 ) -> list[types.TextContent]:
+    ctx = _current_context()
+    with tracer.span(
+        "mcp.call_tool", tool=name, request_id=str(ctx.request_id) if ctx else ""
+    ):
+        return await _call_tool(name, arguments)
+
+
+async def _call_tool(name: str, arguments: dict | None) -> list[types.TextContent]:
+    registry.ensure_loaded(settings.tools_dir)
     server_name, tool_name = name.split(".", 1)
-    result = await registry.execute(server_name, tool_name, arguments or {})
-    return [
-        types.TextContent(type="text", text=json.dumps(result, default=str))
-    ]
+    ctx = _current_context()
+    _track_session()
+
+    # Run the call as its own task so it can be throttled per session and
+    # cancelled. The SDK cancels this handler on notifications/cancelled (and
+    # when the transport closes); that cancellation is forwarded below.
+    task = asyncio.create_task(
+        _run_tool_call(server_name, tool_name, arguments or {}, ctx)
+    )
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        task.cancel()
+        logger.info("MCP call cancelled: %s", name)
+        raise
+
+    with tracer.span("serialize") as span:
+        text = dumps_str(result)
+        span.set("bytes", len(text))
+    return [types.TextContent(type="text", text=text)]
+
+
+# -- tool list changes ------------------------------------------------------
+
+# (registry version, prebuilt tool list)
+_tool_list: tuple[int, list[types.Tool]] | None = None
+
+# Sessions that have talked to us and should hear about tool list changes
+_sessions: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+metrics.gauge(
+    "mcp_sessions", "MCP sessions that have listed or called tools and are still open"
+).set_function(lambda: len(_sessions))
+
+
+def _track_session() -> None:
+    ctx = _current_context()
+    if ctx is not None:
+        _sessions.add(ctx.session)
+
+
+async def _broadcast_list_changed() -> None:
+    for session in list(_sessions):
+        try:
+            await session.send_tool_list_changed()
+        except Exception:
+            # Closed transport — the session will be collected shortly
+            _sessions.discard(session)
+
+
+def _on_registry_change(version: int) -> None:
+    if version <= 1:
+        # The first load (0 -> 1, e.g. lazily on the first tools/list) changes
+        # nothing a client has seen
+        return
+    logger.info("Tool list changed (v%d) — notifying %d MCP sessions", version, len(_sessions))
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(_broadcast_list_changed())
+
+
+registry.subscribe(_on_registry_change)
+
+
+# -- call throttling --------------------------------------------------------
+
+# Per-session concurrency slots, so one client cannot starve the others
+_session_slots: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Stateless HTTP starts a new session for every request, so there slots are
+# keyed by client instead: key -> [semaphore, calls holding or waiting]
+_client_slots: dict[str, list] = {}
+
+
+def _current_context() -> Any:
+    try:
+        return mcp.request_context
+    except LookupError:
+        return None
+
+
+def _client_key(ctx: Any) -> str | None:
+    """A stateless HTTP client's identity: its mcp-session-id header, else its
+    address. None when the session itself is the client (SSE, stdio, stateful)."""
+    request = ctx.request if settings.mcp_stateless else None
+    if request is None:
+        return None
+    session_id = request.headers.get("mcp-session-id")
+    if session_id:
+        return f"session:{session_id}"
+    return f"addr:{request.client.host}" if request.client else None
+
+
+@asynccontextmanager
+async def _call_slot(ctx: Any) -> AsyncIterator[None]:
+    """Hold one of the calling client's mcp_max_inflight_per_session slots."""
+    if ctx is None:
+        yield
+        return
+    key = _client_key(ctx)
+    if key is None:
+        slots = _session_slots.get(ctx.session)
+        if slots is None:
+            slots = asyncio.Semaphore(settings.mcp_max_inflight_per_session)
+            _session_slots[ctx.session] = slots
+        async with slots:
+            yield
+        return
+
+    entry = _client_slots.setdefault(
+        key, [asyncio.Semaphore(settings.mcp_max_inflight_per_session), 0]
+    )
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _client_slots[key]
+
+
+async def _run_tool_call(
+    server_name: str, tool_name: str, arguments: dict, ctx: Any
+) -> dict[str, Any]:
+    """Execute via registry.stream, reporting partial results as progress."""
+    token = ctx.meta.progressToken if ctx and ctx.meta else None
+    async with _call_slot(ctx):
+        received = 0
+        # aclosing: returning mid-stream closes the generator (and its tool
+        # slot) now, not whenever it is garbage-collected
+        async with aclosing(registry.stream(server_name, tool_name, arguments)) as events:
+            async for event in events:
+                if event["type"] == "result":
+                    return event["data"]
+                received += len(event["data"])
+                if token is not None:
+                    await ctx.session.send_progress_notification(
+                        token,
+                        received,
+                        message=f"{received} items received",
+                        related_request_id=str(ctx.request_id),
+                    )
+        raise RuntimeError(f"{server_name}.{tool_name} produced no result")
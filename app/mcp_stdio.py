@@ -0,0 +1,30 @@
+"""
+stdio MCP entry point — the same tools and handlers as /mcp, without the web stack.
+
+    python -m app.mcp_stdio
+
+Tools are loaded on the first tools/list or tools/call, so the process can
+answer `initialize` immediately. Logs go to stderr; stdout carries the protocol.
+"""
+
+import logging
+import sys
+
+import anyio
+from mcp.server.stdio import stdio_server
+
+from .mcp_server import mcp
+
+
+async def _serve() -> None:
+    async with stdio_server() as (read, write):
+        await mcp.run(read, write, mcp.create_initialization_options())
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    anyio.run(_serve)
+
+
+if __name__ == "__main__":
+    main()
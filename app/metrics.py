@@ -0,0 +1,391 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at /metrics.
+
+    from .metrics import metrics
+    calls = metrics.counter("tool_calls_total", "Tool calls", ["server", "tool", "status"])
+    calls.inc(server="wikipedia", tool="search", status="ok")
+
+Counter, Gauge and Histogram cover what the app needs without pulling in
+prometheus_client. Values are kept per process. With several app.serve
+workers, each one publishes a snapshot to a shared directory and /metrics
+merges them (see MetricsRegistry.render_all): counters and histograms are
+summed over every worker that has run, gauges are reported per live worker.
+"""
+
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+# Seconds; spans a cached lookup up to a slow model call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class BoundedLabel:
+    """Caps the distinct values of a label that comes from client input: the
+    first `max_values` are kept, later new ones are reported as "other"."""
+
+    def __init__(self, max_values: int = 20) -> None:
+        self.max_values = max_values
+        self._seen: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value: str) -> str:
+        with self._lock:
+            if value in self._seen:
+                return value
+            if len(self._seen) < self.max_values:
+                self._seen.add(value)
+                return value
+        return "other"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: list[str] | tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    """Monotonic value. `set_function` reads an externally kept count at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function: Callable[[], dict[tuple[str, ...], float] | float] | None = None
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, function: Callable[[], dict[tuple[str, ...], float] | float]) -> None:
+        """Read values at scrape time: a float, or {label values: float}."""
+        self._function = function
+
+    def _items(self) -> list[tuple[tuple[str, ...], float]]:
+        if self._function is not None:
+            values = self._function()
+            return list(values.items()) if isinstance(values, dict) else [((), values)]
+        with self._lock:
+            return list(self._values.items())
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**super().snapshot(), "values": [[list(k), v] for k, v in self._items()]}
+
+    def merge(self, values: list, worker: str) -> None:
+        """Add another worker's snapshot values."""
+        for key, value in values:
+            key = tuple(key)
+            self._values[key] = self._values.get(key, 0.0) + value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def merge(self, values: list, worker: str) -> None:
+        """Another worker's values, under its own `worker` label."""
+        for key, value in values:
+            self._values[(*key, worker)] = value
+
+    @contextmanager
+    def track(self, **labels: Any) -> Iterator[None]:
+        """Count the body as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: list[str] | tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)}"
+                    f" {_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(row[-2])}"
+            yield f"{self.name}_count{labels} {_format_value(row[-1])}"
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            values = [[list(k), list(v)] for k, v in self._values.items()]
+        return {**super().snapshot(), "buckets": list(self.buckets[:-1]), "values": values}
+
+    def merge(self, values: list, worker: str) -> None:
+        for key, row in values:
+            key = tuple(key)
+            mine = self._values.get(key)
+            self._values[key] = row if mine is None else [a + b for a, b in zip(mine, row)]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._caches: dict[str, Any] = {}
+
+    def _add(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Modules reloaded by the tool registry re-declare their metrics
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: list[str] | tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: list[str] | tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: list[str] | tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def register_cache(self, name: str, cache: Any) -> None:
+        """Expose hits/misses/size of a TTLCache or SqliteCache under `name`."""
+        self._caches[name] = cache
+
+    def cache_stats(self, attr: str) -> dict[tuple[str, ...], float]:
+        if attr == "entries":
+            return {(name,): len(cache) for name, cache in self._caches.items()}
+        return {(name,): getattr(cache, attr) for name, cache in self._caches.items()}
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # -- several workers ----------------------------------------------------
+
+    def publish(self, directory: Path) -> None:
+        """Write this process's values where the other workers can read them."""
+        directory.mkdir(parents=True, exist_ok=True)
+        snapshot = {name: m.snapshot() for name, m in list(self._metrics.items())}
+        path = directory / f"{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot))
+        os.replace(tmp, path)
+
+    def render_all(self, directory: Path) -> str:
+        """Merged values of every worker that has published to `directory`.
+
+        Counters and histograms include workers that have exited, so totals
+        never go backwards when a worker is replaced; gauges only describe
+        live workers and get a `worker` label instead of being summed.
+        """
+        self.publish(directory)
+        merged: dict[str, _Metric] = {}
+        for path in sorted(directory.glob("*.json")):
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue  # replaced while we read it
+            worker = path.stem
+            alive = _alive(int(worker))
+            for name, snap in snapshot.items():
+                kind = snap["kind"]
+                if kind == "gauge" and not alive:
+                    continue
+                metric = merged.get(name)
+                if metric is None:
+                    if kind == "histogram":
+                        metric = Histogram(name, snap["help"], snap["labels"], tuple(snap["buckets"]))
+                    elif kind == "gauge":
+                        metric = Gauge(name, snap["help"], [*snap["labels"], "worker"])
+                    else:
+                        metric = Counter(name, snap["help"], snap["labels"])
+                    merged[name] = metric
+                metric.merge(snap["values"], worker)
+        lines: list[str] = []
+        for metric in merged.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    async def publish_forever(self, directory: Path, interval: float = 5.0) -> None:
+        """Publish every `interval` seconds until cancelled, then once more."""
+        try:
+            while True:
+                await asyncio.to_thread(self.publish, directory)
+                await asyncio.sleep(interval)
+        finally:
+            self.publish(directory)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+metrics = MetricsRegistry()
+
+
+# -- shared metrics ---------------------------------------------------------
+
+tool_calls = metrics.counter(
+    "tool_calls_total", "Tool calls by outcome (ok, error, timeout, cancelled)", ["server", "tool", "status"]
+)
+tool_duration = metrics.histogram(
+    "tool_call_duration_seconds", "Tool call latency", ["server", "tool"]
+)
+tools_in_flight = metrics.gauge("tool_calls_in_flight", "Tool calls currently executing")
+
+model_requests = metrics.counter(
+    "model_requests_total", "Chat completion requests by outcome", ["endpoint", "model", "status"]
+)
+model_duration = metrics.histogram(
+    "model_request_duration_seconds", "Chat completion latency", ["endpoint", "model"]
+)
+# Both come from the request body: endpoint is reduced to its host
+model_endpoint_label = BoundedLabel()
+model_name_label = BoundedLabel()
+
+generations_in_flight = metrics.gauge(
+    "generations_in_flight", "Agent loops currently running", ["mode"]
+)
+sse_streams = metrics.gauge("sse_streams_open", "Open SSE responses", ["endpoint"])
+websockets_open = metrics.gauge("websockets_open", "Open /tools/agent/ws connections")
+
+cache_hits = metrics.counter("cache_hits_total", "Cache hits", ["cache"])
+cache_misses = metrics.counter("cache_misses_total", "Cache misses", ["cache"])
+cache_entries = metrics.gauge("cache_entries", "Entries currently cached", ["cache"])
+cache_hits.set_function(lambda: metrics.cache_stats("hits"))
+cache_misses.set_function(lambda: metrics.cache_stats("misses"))
+cache_entries.set_function(lambda: metrics.cache_stats("entries"))
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a scheduled wake-up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+def outcome(exc: BaseException | None) -> str:
+    """Status label for a finished call."""
+    if exc is None:
+        return "ok"
+    if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(exc).__name__:
+        return "timeout"
+    return "error"
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Sample event-loop lag until cancelled (run as a background task)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(0.0, loop.time() - start - interval))
@@ -19,6 +19,27 @@ class ToolCallResponse(BaseModel):
     error: str | None = None
 
 
+class BatchToolCall(ToolCallRequest):
+    """One call in a batch. `depends_on` lists ids of calls that must finish first."""
+
+    id: str | None = None
+    depends_on: list[str] = []
+
+
+class BatchToolCallRequest(BaseModel):
+    calls: list[BatchToolCall]
+    stream: bool = False
+
+
+class BatchToolCallResult(ToolCallResponse):
+    index: int
+    id: str | None = None
+
+
+class BatchToolCallResponse(BaseModel):
+    results: list[BatchToolCallResult]
+
+
 class ToolInfo(BaseModel):
     server: str
     name: str
@@ -47,3 +68,20 @@ class AgentGenerateResponse(BaseModel):
     success: bool
     turns: list[dict[str, Any]] = []
     error: str | None = None
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+
+class JobInfo(BaseModel):
+    id: str
+    status: str
+    error: str | None = None
+    created_at: float
+    updated_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    turn_count: int = 0
+    turns: list[dict[str, Any]] = []
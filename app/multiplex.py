@@ -0,0 +1,213 @@
+"""
+Many agent runs over one WebSocket (/tools/agent/ws).
+
+Client → server, one JSON object per message:
+
+    {"type": "start", "id": "a", "prompt": "...", "api_key": "...", ...}
+    {"type": "pause", "id": "a"}     {"type": "resume", "id": "a"}
+    {"type": "cancel", "id": "a"}
+
+`start` takes the AgentGenerateRequest fields; the client picks the stream id.
+
+Server → client, one JSON array of events per message, each tagged with its
+stream id:
+
+    [{"id": "a", "type": "turn", "turn": {...}}, {"id": "b", "type": "done"}]
+
+Per stream: started, turn, paused, resumed, then exactly one of done, error
+or cancelled. Messages that cannot be applied get {"type": "rejected"}.
+
+A stream runs at most settings.ws_stream_buffer events ahead of the socket:
+when that many are unsent, its agent loop waits before starting the next
+turn, so a slow client throttles model and tool calls instead of piling up
+output. Pause also takes effect between turns. Everything queued when the
+socket is free goes out as one message.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from typing import Any
+
+import httpx
+from fastapi import WebSocket
+from pydantic import ValidationError
+
+from .agent import AgentLoop
+from .config import settings
+from .metrics import generations_in_flight
+from .models import AgentGenerateRequest
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+_FINAL = frozenset({"done", "error", "cancelled"})
+
+
+class _Stream:
+    __slots__ = ("id", "events", "drained", "running", "task")
+
+    def __init__(self, stream_id: str) -> None:
+        self.id = stream_id
+        self.events: deque[dict[str, Any]] = deque()
+        self.drained = asyncio.Event()
+        self.running = asyncio.Event()
+        self.running.set()
+        self.task: asyncio.Task | None = None
+
+
+class Multiplexer:
+    """Serves one WebSocket connection until the client disconnects."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_streams: int | None = None,
+        buffer: int | None = None,
+    ) -> None:
+        self.websocket = websocket
+        self.max_streams = max_streams or settings.ws_max_streams
+        self.buffer = buffer or settings.ws_stream_buffer
+        # Streams with unsent events or a running agent loop, by client id
+        self.streams: dict[str, _Stream] = {}
+        self._rejected: list[dict[str, Any]] = []
+        self._ready = asyncio.Event()
+
+    async def run(self) -> None:
+        reader = asyncio.create_task(self._read())
+        writer = asyncio.create_task(self._write())
+        try:
+            # The reader ends on disconnect; the writer only if sending fails
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            tasks = [reader, writer] + [s.task for s in self.streams.values() if s.task]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # -- client messages ----------------------------------------------------
+
+    async def _read(self) -> None:
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            self._handle(message.get("text") or message.get("bytes") or b"")
+
+    def _handle(self, raw: str | bytes) -> None:
+        try:
+            msg = loads(raw)
+        except ValueError:
+            self._reject(None, "Message is not valid JSON")
+            return
+        if not isinstance(msg, dict):
+            self._reject(None, "Message must be a JSON object")
+            return
+        kind, stream_id = msg.get("type"), msg.get("id")
+        if not isinstance(stream_id, str) or not stream_id:
+            self._reject(stream_id, "Missing stream id")
+            return
+
+        if kind == "start":
+            self._start(stream_id, msg)
+            return
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.task.done():
+            self._reject(stream_id, f"No running stream '{stream_id}'")
+        elif kind == "cancel":
+            stream.task.cancel()
+        elif kind == "pause":
+            stream.running.clear()
+            self._emit(stream, {"type": "paused"})
+        elif kind == "resume":
+            stream.running.set()
+            self._emit(stream, {"type": "resumed"})
+        else:
+            self._reject(stream_id, f"Unknown message type {kind!r}")
+
+    def _start(self, stream_id: str, msg: dict[str, Any]) -> None:
+        if stream_id in self.streams:
+            self._reject(stream_id, f"Stream '{stream_id}' already exists")
+            return
+        active = sum(1 for s in self.streams.values() if not s.task.done())
+        if active >= self.max_streams:
+            self._reject(stream_id, f"Too many streams (max {self.max_streams})")
+            return
+        fields = {k: v for k, v in msg.items() if k not in ("type", "id")}
+        try:
+            request = AgentGenerateRequest.model_validate(fields)
+        except ValidationError as e:
+            self._reject(stream_id, str(e))
+            return
+        stream = _Stream(stream_id)
+        self.streams[stream_id] = stream
+        self._emit(stream, {"type": "started"})
+        stream.task = asyncio.create_task(self._generate(stream, request))
+
+    def _reject(self, stream_id: Any, error: str) -> None:
+        self._rejected.append({"id": stream_id, "type": "rejected", "error": error})
+        self._ready.set()
+
+    # -- agent runs ---------------------------------------------------------
+
+    async def _generate(self, stream: _Stream, request: AgentGenerateRequest) -> None:
+        agent = AgentLoop(
+            request.api_key,
+            request.base_url,
+            request.model,
+            system_prompt=request.system_prompt or None,
+        )
+        with generations_in_flight.track(mode="ws"):
+            try:
+                turns = agent.generate_stream(
+                    request.prompt, request.max_turns, request.temperature
+                )
+                async with aclosing(turns):
+                    async for turn in turns:
+                        await self._put(stream, {"type": "turn", "turn": turn})
+                        await stream.running.wait()
+                final = {"type": "done"}
+            except asyncio.CancelledError:
+                final = {"type": "cancelled"}
+            except httpx.HTTPStatusError as e:
+                logger.exception("Agent API call failed")
+                final = {
+                    "type": "error",
+                    "error": f"API error {e.response.status_code}: {e.response.text[:500]}",
+                }
+            except Exception as e:
+                logger.exception("Agent generation failed")
+                final = {"type": "error", "error": str(e)}
+        self._emit(stream, final)
+
+    async def _put(self, stream: _Stream, event: dict[str, Any]) -> None:
+        """Queue a turn, first waiting while the stream's buffer is full."""
+        while len(stream.events) >= self.buffer:
+            stream.drained.clear()
+            await stream.drained.wait()
+        self._emit(stream, event)
+
+    def _emit(self, stream: _Stream, event: dict[str, Any]) -> None:
+        """Queue an event without waiting (status events are few and small)."""
+        stream.events.append({"id": stream.id, **event})
+        self._ready.set()
+
+    # -- socket writes ------------------------------------------------------
+
+    async def _write(self) -> None:
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            batch: list[dict[str, Any]] = []
+            for stream in list(self.streams.values()):
+                while stream.events:
+                    event = stream.events.popleft()
+                    batch.append(event)
+                    if event["type"] in _FINAL:
+                        del self.streams[stream.id]
+                stream.drained.set()
+            batch.extend(self._rejected)
+            self._rejected.clear()
+            if batch:
+                await self.websocket.send_text(dumps(batch).decode())
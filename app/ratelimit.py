@@ -0,0 +1,133 @@
+"""
+Rate limiting for outgoing API calls.
+
+    limiter = RateLimiter("arxiv", rate=1 / 3)      # one call every 3 s
+    async with limiter:
+        ...
+    limiter.pause(30)                               # the API asked us to back off
+
+Limits follow GCRA (a token bucket that stores a single timestamp): each
+call reserves the next free slot and sleeps until it, so concurrent callers
+are spaced out instead of failing. State lives in memory, or in SQLite when
+`shared` (the default with several app.serve workers) so that all worker
+processes draw from the same budget.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from .config import settings
+from .db import connect
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int = 1,
+        shared: bool | None = None,
+        path: str | Path | None = None,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.name = name
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self.shared = settings.workers != 1 if shared is None else shared
+        self.path = Path(path) if path else settings.cache_dir / "ratelimit.db"
+        self._tat = 0.0  # theoretical arrival time of the next call
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = 0
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    def reserve(self) -> float:
+        """Claim the next slot; returns how long to wait before using it."""
+        now = time.time()
+        with self._lock:
+            if not self.shared:
+                delay, self._tat = self._next(self._tat, now)
+                return delay
+            db = self._db()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                row = db.execute(
+                    "SELECT tat FROM limits WHERE name = ?", (self.name,)
+                ).fetchone()
+                delay, tat = self._next(row[0] if row else 0.0, now)
+                db.execute(
+                    "INSERT OR REPLACE INTO limits (name, tat) VALUES (?, ?)",
+                    (self.name, tat),
+                )
+            return delay
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every call for `seconds`, e.g. when the API says to (Retry-After)."""
+        # The slot at `tat` is allowed burst - 1 intervals early, so offset by that
+        until = time.time() + seconds + (self.burst - 1) * self.interval
+        with self._lock:
+            if not self.shared:
+                self._tat = max(self._tat, until)
+                return
+            db = self._db()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute(
+                    "INSERT INTO limits (name, tat) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET tat = max(tat, excluded.tat)",
+                    (self.name, until),
+                )
+
+    def close(self) -> None:
+        """Close the shared-state connection, if any (reopened on next use)."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def _next(self, tat: float, now: float) -> tuple[float, float]:
+        tat = max(tat, now)
+        allowed_at = tat - (self.burst - 1) * self.interval
+        return max(0.0, allowed_at - now), tat + self.interval
+
+    def _db(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = connect(self.path)
+            conn.isolation_level = None  # explicit BEGIN IMMEDIATE above
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS limits (name TEXT PRIMARY KEY, tat REAL NOT NULL)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Waits for a RateLimiter slot before each request that reaches the network."""
+
+    def __init__(self, limiter: RateLimiter, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self.limiter = limiter
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self.limiter.acquire()
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
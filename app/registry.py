@@ -1,29 +1,128 @@
+import asyncio
+import hashlib
 import importlib.util
+import json
 import logging
 import sys
+import time
+from collections.abc import AsyncIterator, Callable
 from pathlib import Path
 from typing import Any
 
+from .config import settings
+from .metrics import outcome, tool_calls, tool_duration, tools_in_flight
+from .serialization import dumps
+from .tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 
 class ToolRegistry:
-    """Auto-discovers .py files in tools/ and registers whatever `server` they export."""
+    """Auto-discovers .py files in tools/ and registers whatever `server` they export.
+
+    `version` increases whenever the set of tools changes; listeners added with
+    `subscribe()` are called with the new version. `version` counts changes in
+    this process only; `digest` identifies the tool list itself, so it is the
+    same across restarts and workers. At most `max_concurrency`
+    calls to each tool server run at once; the rest wait for a slot. Slots are
+    per server because tools pace themselves inside a call (rate limits), and
+    a server that is waiting on its API must not starve the others.
+
+    `reload()` closes the servers it replaces (their `aclose()`, if any) once
+    calls still running on them have had settings.shutdown_timeout to finish.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, max_concurrency: int = 16) -> None:
         self._servers: dict[str, Any] = {}
+        self._max_concurrency = max_concurrency
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._tools_dir: Path | None = None
+        self._tools_cache: list[dict[str, Any]] | None = None
+        self._listeners: list[Callable[[int], None]] = []
+        self._retiring: set[asyncio.Task] = set()
+        self.version = 0
+        self.digest = self._digest(self._fingerprint())
 
     def load_tools(self, tools_dir: str | Path) -> None:
         tools_dir = Path(tools_dir)
+        self._tools_dir = tools_dir
         if not tools_dir.exists():
             logger.warning("Tools directory not found: %s", tools_dir)
             return
 
+        before = self._fingerprint()
+        self._scan(tools_dir)
+        self._changed(before)
+
+    def ensure_loaded(self, tools_dir: str | Path) -> None:
+        """Load tools on first use; a no-op once load_tools has run."""
+        if self._tools_dir is None:
+            self.load_tools(tools_dir)
+
+    def reload(self) -> int:
+        """Re-scan the tools directory from scratch. Returns the (new) version."""
+        if self._tools_dir is None or not self._tools_dir.exists():
+            return self.version
+        before = self._fingerprint()
+        old, self._servers = self._servers, {}
+        self._scan(self._tools_dir)
+        self._changed(before)
+        self._retire(list(old.values()))
+        return self.version
+
+    def subscribe(self, listener: Callable[[int], None]) -> None:
+        self._listeners.append(listener)
+
+    def _retire(self, servers: list[Any]) -> None:
+        """Release the clients, pools and SQLite handles of replaced servers."""
+        servers = [s for s in servers if hasattr(s, "aclose")]
+        if not servers:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._close(servers))
+            return
+        task = loop.create_task(self._close(servers, delay=settings.shutdown_timeout))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    @staticmethod
+    async def _close(servers: list[Any], delay: float = 0.0) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        for server in servers:
+            try:
+                await server.aclose()
+            except Exception:
+                logger.exception("Closing %s failed", server.name)
+
+    def _scan(self, tools_dir: Path) -> None:
         for py_file in sorted(tools_dir.glob("*.py")):
             if py_file.name.startswith("_"):
                 continue
             self._load_module(py_file)
 
+    def _fingerprint(self) -> str:
+        return json.dumps(self._build_tool_list(), sort_keys=True, default=str)
+
+    @staticmethod
+    def _digest(fingerprint: str) -> str:
+        return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+    def _changed(self, before: str) -> None:
+        self._tools_cache = None
+        after = self._fingerprint()
+        if after == before:
+            return
+        self.digest = self._digest(after)
+        self.version += 1
+        for listener in self._listeners:
+            try:
+                listener(self.version)
+            except Exception:
+                logger.exception("Registry listener failed")
+
     def _load_module(self, path: Path) -> None:
         module_name = f"tools.{path.stem}"
         spec = importlib.util.spec_from_file_location(module_name, path)
@@ -48,6 +147,12 @@ class ToolRegistry:
         return list(self._servers.keys())
 
     def list_tools(self) -> list[dict[str, Any]]:
+        """MCP-style tool list, built once per registry version."""
+        if self._tools_cache is None:
+            self._tools_cache = self._build_tool_list()
+        return list(self._tools_cache)
+
+    def _build_tool_list(self) -> list[dict[str, Any]]:
         tools: list[dict[str, Any]] = []
         for name, srv in self._servers.items():
             for tool_name, tool_cfg in srv.get_tools_config().items():
@@ -59,6 +164,9 @@ class ToolRegistry:
                         "type": pcfg.get("type", "string"),
                         "description": pcfg.get("description", ""),
                     }
+                    for key in ("items", "minimum", "maximum"):
+                        if key in pcfg:
+                            properties[pname][key] = pcfg[key]
                     if pcfg.get("required", False):
                         required.append(pname)
 
@@ -81,12 +189,82 @@ class ToolRegistry:
     async def execute(
         self, server_name: str, tool_name: str, arguments: dict[str, Any]
     ) -> dict[str, Any]:
+        server = self._resolve(server_name, tool_name)
+        with tracer.span("tool_call", server=server_name, tool=tool_name) as span:
+            if span.recording:
+                span.set("arguments_bytes", len(dumps(arguments)))
+            queued = time.perf_counter()
+            async with self._slot(server_name):
+                started, error = time.perf_counter(), None
+                span.set("queued_ms", (started - queued) * 1000)
+                tools_in_flight.inc()
+                try:
+                    return await server.execute(tool_name, arguments)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    tools_in_flight.dec()
+                    self._record(server_name, tool_name, started, error)
+
+    async def stream(
+        self, server_name: str, tool_name: str, arguments: dict[str, Any]
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield {"type": "partial", "data": [...]} events for tools that can
+        produce results incrementally, then one {"type": "result", "data": ...}."""
+        server = self._resolve(server_name, tool_name)
+        tool_cfg = server.get_tools_config().get(tool_name, {})
+        # Not made current: this generator yields while the span is open
+        span = tracer.start_span("tool_call", server=server_name, tool=tool_name)
+        queued, error = time.perf_counter(), None
+        try:
+            # The span covers the wait for a slot, which may be cancelled too
+            async with self._slot(server_name):
+                started = time.perf_counter()
+                span.set("queued_ms", (started - queued) * 1000)
+                tools_in_flight.inc()
+                try:
+                    if not (tool_cfg.get("paginate") and hasattr(server, "stream")):
+                        result = await server.execute(tool_name, arguments)
+                    else:
+                        items: list[Any] = []
+                        async for page in server.stream(tool_name, arguments):
+                            items.extend(page)
+                            yield {"type": "partial", "data": page}
+                        result = {"result": items}
+                        span.set("items", len(items))
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    tools_in_flight.dec()
+                    self._record(server_name, tool_name, started, error)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tracer.end_span(span, error)
+        # Outside the slot: the consumer may take its time with the result
+        yield {"type": "result", "data": result}
+
+    def _slot(self, server_name: str) -> asyncio.Semaphore:
+        slot = self._slots.get(server_name)
+        if slot is None:
+            slot = self._slots[server_name] = asyncio.Semaphore(self._max_concurrency)
+        return slot
+
+    @staticmethod
+    def _record(server: str, tool: str, started: float, error: BaseException | None) -> None:
+        tool_duration.observe(time.perf_counter() - started, server=server, tool=tool)
+        tool_calls.inc(server=server, tool=tool, status=outcome(error))
+
+    def _resolve(self, server_name: str, tool_name: str) -> Any:
         server = self._servers.get(server_name)
         if not server:
             raise ValueError(f"Unknown server: {server_name}")
         if tool_name not in server.get_tool_names():
             raise ValueError(f"Unknown tool '{tool_name}' in '{server_name}'")
-        return await server.execute(tool_name, arguments)
+        return server
 
 
-registry = ToolRegistry()
+registry = ToolRegistry(max_concurrency=settings.tool_concurrency)
@@ -1,33 +1,85 @@
-import json
+import asyncio
 import logging
+from collections.abc import AsyncIterator
 from pathlib import Path
+from typing import Any
 
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from .agent import AgentLoop
+from .compression import compress, negotiate
+from .config import settings
+from .jobs import TERMINAL, jobs
+from .jsonl import aiter_lines, aiter_trajectories, dump_trajectory
+from .metrics import generations_in_flight, sse_streams, websockets_open
 from .models import (
     AgentGenerateRequest,
     AgentGenerateResponse,
+    BatchToolCall,
+    BatchToolCallRequest,
+    BatchToolCallResponse,
+    BatchToolCallResult,
+    JobInfo,
+    JobSubmitResponse,
     ToolCallRequest,
     ToolCallResponse,
     ToolListResponse,
 )
+from .multiplex import Multiplexer
 from .registry import registry
+from .serialization import dumps
+from .store import store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/tools", tags=["tools"])
 
 _SYSTEM_PROMPT_PATH = Path(__file__).resolve().parent.parent / "system-prompt.md"
+_IMPORT_BATCH = 100  # trajectories per transaction in import.jsonl
+
+
+# Encoded (and compressed) /tools/ bodies, keyed by (tool list digest, encoding)
+_tools_bodies: dict[tuple[str, str | None], bytes] = {}
 
 
 @router.get("/", response_model=ToolListResponse)
-async def list_tools():
-    """List all available tools across all servers (MCP-compatible format)."""
-    return {"tools": registry.list_tools()}
+async def list_tools(request: Request):
+    """List all available tools across all servers (MCP-compatible format).
+
+    Tagged with a hash of the tool list and the content-encoding, so the tag
+    means the same on every worker and after restarts; clients can
+    revalidate with If-None-Match. The body is encoded once per tool list
+    and content-encoding.
+    """
+    digest = registry.digest
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    etag = f'"tools-{digest}-{encoding or "identity"}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+
+    body = _tools_bodies.get((digest, encoding))
+    if body is None:
+        if any(d != digest for d, _ in _tools_bodies):
+            _tools_bodies.clear()
+        body = dumps({"tools": registry.list_tools()})
+        if encoding is not None:
+            body = compress(body, encoding)
+        _tools_bodies[(digest, encoding)] = body
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.post("/reload")
+async def reload_tools():
+    """Re-scan the tools directory. MCP clients get notifications/tools/list_changed."""
+    version = registry.reload()
+    return {"version": version, "tools": len(registry.list_tools())}
 
 
 @router.get("/servers")
@@ -63,29 +115,135 @@ async def execute_tool(request: ToolCallRequest):
         )
 
 
+@router.post("/execute/batch", response_model=BatchToolCallResponse)
+async def execute_batch(request: BatchToolCallRequest):
+    """Execute many tool calls concurrently, honouring `depends_on` ordering.
+
+    Results come back in input order, or as NDJSON lines in completion order
+    when `stream` is true. Concurrency is bounded by the registry.
+    """
+    calls = request.calls
+    if len(calls) > settings.batch_max_calls:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(calls)} calls (max {settings.batch_max_calls})",
+        )
+    by_id = _check_dependencies(calls)
+
+    tasks: list[asyncio.Task] = []
+
+    async def run(index: int) -> BatchToolCallResult:
+        call = calls[index]
+        for dep in call.depends_on:
+            dep_result = await tasks[by_id[dep]]
+            if not dep_result.success:
+                return BatchToolCallResult(
+                    index=index, id=call.id, server=call.server, tool=call.tool,
+                    success=False, error=f"Dependency '{dep}' failed",
+                )
+        try:
+            result = await registry.execute(call.server, call.tool, call.arguments)
+            return BatchToolCallResult(
+                index=index, id=call.id, server=call.server, tool=call.tool,
+                success=True, result=result,
+            )
+        except Exception as e:
+            logger.warning("Batch call %d failed: %s.%s — %s", index, call.server, call.tool, e)
+            return BatchToolCallResult(
+                index=index, id=call.id, server=call.server, tool=call.tool,
+                success=False, error=str(e),
+            )
+
+    tasks.extend(asyncio.create_task(run(i)) for i in range(len(calls)))
+
+    if not request.stream:
+        return BatchToolCallResponse(results=await asyncio.gather(*tasks))
+
+    async def ndjson():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield result.model_dump_json() + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def _check_dependencies(calls: list[BatchToolCall]) -> dict[str, int]:
+    """Map call ids to indexes; reject duplicate ids, unknown ids and cycles."""
+    by_id: dict[str, int] = {}
+    for i, call in enumerate(calls):
+        if call.id is None:
+            continue
+        if call.id in by_id:
+            raise HTTPException(status_code=400, detail=f"Duplicate call id '{call.id}'")
+        by_id[call.id] = i
+
+    for call in calls:
+        for dep in call.depends_on:
+            if dep not in by_id:
+                raise HTTPException(status_code=400, detail=f"Unknown dependency '{dep}'")
+
+    # Iterative DFS: 1 = on stack, 2 = done
+    state = [0] * len(calls)
+    for root in range(len(calls)):
+        stack = [(root, iter(calls[root].depends_on))]
+        state[root] = state[root] or 1
+        while stack:
+            node, deps = stack[-1]
+            dep = next(deps, None)
+            if dep is None:
+                state[node] = 2
+                stack.pop()
+                continue
+            child = by_id[dep]
+            if state[child] == 1:
+                raise HTTPException(
+                    status_code=400, detail=f"Dependency cycle through '{dep}'"
+                )
+            if state[child] == 0:
+                state[child] = 1
+                stack.append((child, iter(calls[child].depends_on)))
+    return by_id
+
+
 @router.post("/agent/generate", response_model=AgentGenerateResponse)
 async def generate_trajectory(request: AgentGenerateRequest):
     """Run an AI agent loop to generate a trajectory from a prompt."""
-    try:
-        agent = AgentLoop(
-            request.api_key,
-            request.base_url,
-            request.model,
-            system_prompt=request.system_prompt or None,
-        )
-        turns = await agent.generate(
-            request.prompt, request.max_turns, request.temperature
-        )
-        return AgentGenerateResponse(success=True, turns=turns)
-    except httpx.HTTPStatusError as e:
-        logger.exception("Agent API call failed")
-        return AgentGenerateResponse(
-            success=False,
-            error=f"API error {e.response.status_code}: {e.response.text[:500]}",
-        )
-    except Exception as e:
-        logger.exception("Agent generation failed")
-        return AgentGenerateResponse(success=False, error=str(e))
+    with generations_in_flight.track(mode="sync"):
+        try:
+            agent = AgentLoop(
+                request.api_key,
+                request.base_url,
+                request.model,
+                system_prompt=request.system_prompt or None,
+            )
+            turns = await agent.generate(
+                request.prompt, request.max_turns, request.temperature
+            )
+            return AgentGenerateResponse(success=True, turns=turns)
+        except httpx.HTTPStatusError as e:
+            logger.exception("Agent API call failed")
+            return AgentGenerateResponse(
+                success=False,
+                error=f"API error {e.response.status_code}: {e.response.text[:500]}",
+            )
+        except Exception as e:
+            logger.exception("Agent generation failed")
+            return AgentGenerateResponse(success=False, error=str(e))
+
+
+def _sse(event: dict[str, Any]) -> bytes:
+    return b"data: " + dumps(event) + b"\n\n"
+
+
+async def _tracked_sse(events: AsyncIterator[bytes], endpoint: str) -> AsyncIterator[bytes]:
+    """Count the stream in sse_streams_open while the client is connected."""
+    with sse_streams.track(endpoint=endpoint):
+        async for event in events:
+            yield event
 
 
 @router.post("/agent/generate/stream")
@@ -99,27 +257,242 @@ async def generate_trajectory_stream(request: AgentGenerateRequest):
     )
 
     async def event_stream():
-        try:
-            async for turn in agent.generate_stream(
-                request.prompt, request.max_turns, request.temperature
-            ):
-                yield f"data: {json.dumps({'type': 'turn', 'turn': turn})}\n\n"
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-        except httpx.HTTPStatusError as e:
-            error_msg = f"API error {e.response.status_code}: {e.response.text[:500]}"
-            logger.exception("Agent API call failed")
-            yield f"data: {json.dumps({'type': 'error', 'error': error_msg})}\n\n"
-        except Exception as e:
-            logger.exception("Agent generation failed")
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        with generations_in_flight.track(mode="stream"):
+            try:
+                async for turn in agent.generate_stream(
+                    request.prompt, request.max_turns, request.temperature
+                ):
+                    yield _sse({"type": "turn", "turn": turn})
+                yield _sse({"type": "done"})
+            except httpx.HTTPStatusError as e:
+                error_msg = f"API error {e.response.status_code}: {e.response.text[:500]}"
+                logger.exception("Agent API call failed")
+                yield _sse({"type": "error", "error": error_msg})
+            except Exception as e:
+                logger.exception("Agent generation failed")
+                yield _sse({"type": "error", "error": str(e)})
 
     return StreamingResponse(
-        event_stream(),
+        _tracked_sse(event_stream(), "generate"),
         media_type="text/event-stream",
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@router.websocket("/agent/ws")
+async def generate_trajectories_ws(websocket: WebSocket):
+    """Run many generations over one WebSocket with per-stream ids.
+
+    Streams can be paused, resumed and cancelled mid-run; see app.multiplex
+    for the message format.
+    """
+    await websocket.accept()
+    with websockets_open.track():
+        await Multiplexer(websocket).run()
+
+
+# -- background jobs --------------------------------------------------------
+
+@router.post("/agent/jobs", response_model=JobSubmitResponse)
+async def submit_job(request: AgentGenerateRequest):
+    """Queue a trajectory generation. Poll or stream it by job id."""
+    return JobSubmitResponse(job_id=jobs.submit(request), status="queued")
+
+
+@router.get("/agent/jobs")
+async def list_jobs(status: str | None = None, limit: int = 50, offset: int = 0):
+    """List jobs, newest first."""
+    return {"jobs": jobs.list_jobs(status, min(limit, 500), offset)}
+
+
+@router.get("/agent/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, after: int = 0):
+    """Job status plus the turns completed after turn number `after`."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return JobInfo(**job, turns=jobs.turns(job_id, after))
+
+
+@router.get("/agent/jobs/{job_id}/stream")
+async def stream_job(job_id: str, after: int = 0):
+    """Stream a job's turns via SSE (same events as /agent/generate/stream).
+
+    Reconnect with `after=<last turn seen>` to resume without duplicates.
+    """
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    # Another worker may be running the job; its updates are only seen by polling
+    poll = 15.0 if settings.workers == 1 else 1.0
+
+    async def event_stream():
+        last = after
+        idle = 0.0
+        while True:
+            changed = jobs.update_event(job_id)
+            job = jobs.get(job_id)
+            for turn in jobs.turns(job_id, last):
+                last = turn["turn"]
+                yield _sse({"type": "turn", "turn": turn})
+            if job["status"] == "done":
+                yield _sse({"type": "done"})
+                return
+            if job["status"] in TERMINAL:
+                error = job["error"] or job["status"]
+                yield _sse({"type": "error", "error": error})
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=poll)
+                idle = 0.0
+            except asyncio.TimeoutError:
+                idle += poll
+                if idle >= 15:
+                    idle = 0.0
+                    yield b": keep-alive\n\n"
+
+    return StreamingResponse(
+        _tracked_sse(event_stream(), "job"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/agent/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return {"cancelled": await jobs.cancel(job_id)}
+
+
+# -- trajectory store -------------------------------------------------------
+
+@router.post("/trajectories")
+async def save_trajectories(document: dict[str, Any]):
+    """Store an exported {prompt, trajectories: [...]} document or a single
+    {prompt, name, source, model, turns} trajectory."""
+    # SQLite writes run in a thread so they don't stall the event loop
+    if "trajectories" in document:
+        ids = await asyncio.to_thread(store.add_document, document)
+    elif "turns" in document:
+        ids = [await asyncio.to_thread(store.add, document.get("prompt", ""), document)]
+    else:
+        raise HTTPException(status_code=422, detail="Expected 'trajectories' or 'turns'")
+    return {"ids": ids}
+
+
+@router.get("/trajectories")
+async def query_trajectories(
+    prompt_hash: str | None = None,
+    model: str | None = None,
+    source: str | None = None,
+    tool: str | None = None,
+    min_turns: int | None = None,
+    max_turns: int | None = None,
+    limit: int = 50,
+    offset: int = 0,
+):
+    """List stored trajectories (summaries only), newest first.
+
+    `tool` filters on "server.tool" used anywhere in the trajectory.
+    """
+    total, rows = store.query(
+        prompt_hash=prompt_hash,
+        model=model,
+        source=source,
+        tool=tool,
+        min_turns=min_turns,
+        max_turns=max_turns,
+        limit=min(limit, 500),
+        offset=offset,
+    )
+    return {"total": total, "limit": limit, "offset": offset, "trajectories": rows}
+
+
+@router.get("/trajectories/prompts")
+async def list_prompts(limit: int = 50, offset: int = 0):
+    """Distinct prompts (hash + preview) with their trajectory counts."""
+    return {"prompts": store.prompts(min(limit, 500), offset)}
+
+
+@router.get("/trajectories/compare")
+async def compare_trajectories(ids: str):
+    """Side-by-side summaries and tool sequences for comma-separated ids."""
+    return {"trajectories": store.compare([i for i in ids.split(",") if i])}
+
+
+@router.post("/trajectories/import.jsonl")
+async def import_trajectories_jsonl(request: Request):
+    """Stream a JSONL body (see app/jsonl.py) into the store, written in
+    batches of _IMPORT_BATCH trajectories (one transaction each, in a thread)."""
+    ids: list[str] = []
+    batch: list[tuple[str, dict[str, Any]]] = []
+    try:
+        async for traj in aiter_trajectories(aiter_lines(request.stream())):
+            batch.append((traj.pop("prompt", ""), traj))
+            if len(batch) >= _IMPORT_BATCH:
+                ids += await asyncio.to_thread(store.add_many, batch)
+                batch = []
+    except ValueError as e:  # includes JSONDecodeError
+        # Keep what was read before the bad line, as a line-by-line import would
+        ids += await asyncio.to_thread(store.add_many, batch)
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid JSONL after {len(ids)} trajectories: {e}",
+        )
+    ids += await asyncio.to_thread(store.add_many, batch)
+    return {"imported": len(ids), "ids": ids}
+
+
+@router.get("/trajectories/export.jsonl")
+async def export_trajectories_jsonl(
+    prompt_hash: str | None = None,
+    model: str | None = None,
+    source: str | None = None,
+    tool: str | None = None,
+    min_turns: int | None = None,
+    max_turns: int | None = None,
+    per_turn: bool = False,
+):
+    """Stream matching trajectories as JSONL, newest first.
+
+    With `per_turn`, each trajectory is a header line followed by one line
+    per turn.
+    """
+    def lines():
+        for traj in store.iter_full(
+            prompt_hash=prompt_hash,
+            model=model,
+            source=source,
+            tool=tool,
+            min_turns=min_turns,
+            max_turns=max_turns,
+        ):
+            yield from dump_trajectory(traj, per_turn=per_turn)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="trajectories.jsonl"'},
+    )
+
+
+@router.get("/trajectories/{traj_id}")
+async def get_trajectory(traj_id: str):
+    traj = store.get(traj_id)
+    if traj is None:
+        raise HTTPException(status_code=404, detail=f"Unknown trajectory: {traj_id}")
+    return traj
+
+
+@router.delete("/trajectories/{traj_id}")
+async def delete_trajectory(traj_id: str):
+    if not await asyncio.to_thread(store.delete, traj_id):
+        raise HTTPException(status_code=404, detail=f"Unknown trajectory: {traj_id}")
+    return {"success": True}
+
+
 @router.get("/system-prompt")
 async def get_system_prompt():
     """Read the system prompt from system-prompt.md."""
@@ -15,14 +15,43 @@ Usage — REST API:
         description="...",
         parameters={"param": {"required": True, "location": "path"}},
     )
+
+    # Paginated / batched endpoints:
+    server.get("list", "/items", paginate={"type": "cursor", "items": "data",
+                                          "cursor_path": "next", "cursor_param": "cursor"})
+    server.get("lookup", "/items", batch={"param": "ids", "separator": ","})
+
+    # Optional HTTP cache (ETag / Last-Modified / Cache-Control aware):
+    server = RestServer("name", base_url="https://...", cache_entries=256, cache_persist=True)
+
+    # Optional client-side rate limit (requests per second, shared by all workers):
+    server = RestServer("name", base_url="https://...", rate_limit=1.0)
+
+Module-level resources (clients, thread pools, SQLite caches) are released
+when the registry drops the server, e.g. on reload:
+
+    @server.on_close
+    async def _close() -> None:
+        await _client.aclose()
 """
 
+import asyncio
 import inspect
+import logging
 import os
+from collections.abc import AsyncIterator
 from typing import Any, Awaitable, Callable
 
 import httpx
 
+from .cache import SqliteCache
+from .config import settings
+from .http_cache import CachingTransport, HttpCache
+from .metrics import metrics
+from .ratelimit import RateLimitedTransport, RateLimiter
+
+logger = logging.getLogger(__name__)
+
 
 # ---------------------------------------------------------------------------
 # ToolServer — for custom logic (calculator, scrapers, anything)
@@ -34,6 +63,7 @@ class ToolServer:
         self.description = description
         self._tools: dict[str, dict] = {}
         self._handlers: dict[str, Callable[..., Awaitable[dict]]] = {}
+        self._closers: list[Callable[[], Any]] = []
 
     # -- decorator ----------------------------------------------------------
     def register(
@@ -55,6 +85,21 @@ class ToolServer:
 
         return decorator
 
+    def on_close(self, callback: Callable[[], Any]) -> Callable[[], Any]:
+        """Decorator. Register cleanup (sync or async) for aclose()."""
+        self._closers.append(callback)
+        return callback
+
+    async def aclose(self) -> None:
+        """Release the module's resources; called when the server is dropped."""
+        for callback in self._closers:
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Closing %s failed", self.name)
+
     # -- execution ----------------------------------------------------------
     async def execute(self, tool_name: str, arguments: dict[str, Any]) -> dict[str, Any]:
         handler = self._handlers.get(tool_name)
@@ -72,7 +117,10 @@ class ToolServer:
     # -- helpers ------------------------------------------------------------
     @staticmethod
     def _params_from_func(func: Callable) -> dict:
-        type_map = {str: "string", int: "integer", float: "number", bool: "boolean"}
+        type_map = {
+            str: "string", int: "integer", float: "number", bool: "boolean",
+            dict: "object", list: "array",
+        }
         params: dict[str, dict] = {}
         for pname, param in inspect.signature(func).parameters.items():
             params[pname] = {
@@ -83,6 +131,15 @@ class ToolServer:
         return params
 
 
+def _dig(data: Any, dotted: str) -> Any:
+    """Follow a dotted path into nested dicts; None if any key is missing."""
+    for key in dotted.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
 # ---------------------------------------------------------------------------
 # RestServer — for REST APIs (config-driven, zero handler code)
 # ---------------------------------------------------------------------------
@@ -98,6 +155,9 @@ class RestServer:
         auth_env_var: str = "",
         auth_header: str = "Authorization",
         auth_prefix: str = "",
+        cache_entries: int = 0,
+        cache_persist: bool = False,
+        rate_limit: float | None = None,
     ) -> None:
         self.name = name
         self.description = description
@@ -107,8 +167,12 @@ class RestServer:
         self.auth_env_var = auth_env_var
         self.auth_header = auth_header
         self.auth_prefix = auth_prefix
+        self.cache_entries = cache_entries
+        self.cache_persist = cache_persist
+        self.rate_limit = rate_limit
         self._tools: dict[str, dict] = {}
         self._client: httpx.AsyncClient | None = None
+        self._disk: SqliteCache | None = None
 
     # -- declarative tool registration --------------------------------------
     def get(self, tool_name: str, path: str, **kw: Any):
@@ -125,22 +189,166 @@ class RestServer:
         description: str = "",
         parameters: dict | None = None,
         extract: str | None = None,
+        fixed_params: dict | None = None,
+        paginate: dict | None = None,
+        batch: dict | None = None,
     ):
+        parameters = dict(parameters or {})
+        if paginate:
+            parameters.setdefault("max_items", {
+                "type": "integer",
+                "required": False,
+                "location": "local",
+                "description": f"Maximum items to return (default {paginate.get('max_items', 50)})",
+            })
+        if batch:
+            parameters[batch["param"]] = {
+                **parameters.get(batch["param"], {}),
+                "type": "array",
+                "items": {"type": "string"},
+            }
         self._tools[tool_name] = {
             "description": description,
             "method": method,
             "path": path,
-            "parameters": parameters or {},
+            "parameters": parameters,
             "extract": extract,
+            "fixed_params": fixed_params or {},
+            "paginate": paginate,
+            "batch": batch,
         }
 
     # -- execution ----------------------------------------------------------
     async def execute(self, tool_name: str, arguments: dict[str, Any]) -> dict[str, Any]:
         tool = self._tools[tool_name]
-        method = tool["method"]
-        path: str = tool["path"]
 
-        query_params: dict[str, Any] = {}
+        if tool.get("batch"):
+            return {"result": await self._execute_batch(tool, arguments)}
+
+        if tool.get("paginate"):
+            items: list[Any] = []
+            async for page in self.stream(tool_name, arguments):
+                items.extend(page)
+            return {"result": items}
+
+        path, query_params, body_params = self._build_request(tool, arguments)
+        result = await self._send(tool, path, query_params, body_params, arguments)
+        return {"result": self._extract(result, tool.get("extract"))}
+
+    async def stream(
+        self, tool_name: str, arguments: dict[str, Any]
+    ) -> AsyncIterator[list[Any]]:
+        """Yield the pages of a paginated tool lazily, stopping at max_items.
+
+        Descriptor keys (``paginate={...}``):
+            type        cursor | offset | page
+            items       dotted path to the item list (defaults to ``extract``)
+            cursor_path dotted path to the next cursor; a dict is merged into the query
+            cursor_param query param that carries a scalar cursor
+            offset_param / page_param, page_start
+            max_pages (default 10), max_items (default 50)
+        """
+        tool = self._tools[tool_name]
+        spec = tool["paginate"]
+        kind = spec.get("type", "cursor")
+        limit = int(arguments.get("max_items") or spec.get("max_items", 50))
+        path, query_params, body_params = self._build_request(tool, arguments)
+
+        offset = int(query_params.get(spec.get("offset_param", ""), 0))
+        page_no = spec.get("page_start", 1)
+        seen = 0
+
+        for _ in range(spec.get("max_pages", 10)):
+            if kind == "offset":
+                query_params[spec["offset_param"]] = offset
+            elif kind == "page":
+                query_params[spec["page_param"]] = page_no
+
+            data = await self._send(tool, path, query_params, body_params, arguments)
+            # Strict lookup: a page without the items path ends the stream
+            # rather than having the whole response read as items
+            items_path = spec.get("items") or tool.get("extract")
+            items = _dig(data, items_path) if items_path else data
+            if isinstance(items, dict):
+                items = list(items.values())
+            elif not isinstance(items, list):
+                items = [items] if items else []
+            if not items:
+                return
+
+            yield items[: limit - seen]
+            seen += len(items)
+            if seen >= limit:
+                return
+
+            if kind == "cursor":
+                cursor = _dig(data, spec["cursor_path"])
+                if not cursor:
+                    return
+                if isinstance(cursor, dict):
+                    query_params.update(cursor)
+                else:
+                    query_params[spec["cursor_param"]] = cursor
+            elif kind == "offset":
+                offset += len(items)
+            else:
+                page_no += 1
+
+    async def _execute_batch(self, tool: dict, arguments: dict[str, Any]) -> Any:
+        """Fold a list argument into as few upstream calls as the API allows.
+
+        Descriptor keys (``batch={...}``): param, separator (default ","),
+        max_size (default 50). E.g. MediaWiki ``titles=A|B|C``.
+        """
+        spec = tool["batch"]
+        pname = spec["param"]
+        values = arguments.get(pname) or []
+        if isinstance(values, str):
+            values = [values]
+        values = list(dict.fromkeys(str(v) for v in values))
+        size = spec.get("max_size", 50)
+        separator = spec.get("separator", ",")
+
+        async def _one(chunk: list[str]) -> Any:
+            args = {**arguments, pname: separator.join(chunk)}
+            path, query_params, body_params = self._build_request(tool, args)
+            data = await self._send(tool, path, query_params, body_params, args)
+            return self._extract(data, tool.get("extract"))
+
+        parts = await asyncio.gather(
+            *(_one(values[i : i + size]) for i in range(0, len(values), size))
+        )
+        if all(isinstance(p, list) for p in parts):
+            return [item for p in parts for item in p]
+        if all(isinstance(p, dict) for p in parts):
+            merged: dict[str, Any] = {}
+            for p in parts:
+                merged.update(p)
+            return merged
+        return list(parts)
+
+    # -- introspection ------------------------------------------------------
+    def get_tool_names(self) -> list[str]:
+        return list(self._tools.keys())
+
+    def get_tools_config(self) -> dict:
+        return self._tools
+
+    async def aclose(self) -> None:
+        """Close the HTTP client and disk cache; called when the server is dropped."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._disk is not None:
+            self._disk.close()
+
+    # -- internal -----------------------------------------------------------
+    @staticmethod
+    def _build_request(
+        tool: dict, arguments: dict[str, Any]
+    ) -> tuple[str, dict[str, Any], dict[str, Any]]:
+        path: str = tool["path"]
+        query_params: dict[str, Any] = dict(tool.get("fixed_params") or {})
         body_params: dict[str, Any] = {}
 
         for pname, pconfig in tool.get("parameters", {}).items():
@@ -152,35 +360,43 @@ class RestServer:
                 path = path.replace(f"{{{pname}}}", str(value))
             elif location == "body":
                 body_params[pname] = value
-            else:
+            elif location != "local":
                 query_params[pname] = value
+        return path, query_params, body_params
 
+    async def _send(
+        self,
+        tool: dict,
+        path: str,
+        query_params: dict[str, Any],
+        body_params: dict[str, Any],
+        arguments: dict[str, Any],
+    ) -> Any:
         client = await self._get_client()
+        method = tool["method"]
 
         if method == "GET":
             resp = await client.get(path, params=query_params)
         elif method == "POST":
-            resp = await client.post(path, json=body_params or arguments, params=query_params)
+            local = {
+                p for p, c in tool.get("parameters", {}).items()
+                if c.get("location") == "local"
+            }
+            payload = body_params or {k: v for k, v in arguments.items() if k not in local}
+            resp = await client.post(path, json=payload, params=query_params)
         else:
             resp = await client.request(method, path, params=query_params, json=body_params)
 
         resp.raise_for_status()
-        result = resp.json()
+        return resp.json()
 
-        if tool.get("extract") and isinstance(result, dict):
-            for key in tool["extract"].split("."):
+    @staticmethod
+    def _extract(result: Any, extract: str | None) -> Any:
+        if extract and isinstance(result, dict):
+            for key in extract.split("."):
                 result = result.get(key, result)
+        return result
 
-        return {"result": result}
-
-    # -- introspection ------------------------------------------------------
-    def get_tool_names(self) -> list[str]:
-        return list(self._tools.keys())
-
-    def get_tools_config(self) -> dict:
-        return self._tools
-
-    # -- internal -----------------------------------------------------------
     async def _get_client(self) -> httpx.AsyncClient:
         if self._client is None:
             headers = {**self.headers}
@@ -191,6 +407,33 @@ class RestServer:
                 key = os.getenv(self.auth_env_var, "")
                 headers["Authorization"] = f"Bearer {key}"
             self._client = httpx.AsyncClient(
-                base_url=self.base_url, headers=headers, timeout=30.0
+                base_url=self.base_url,
+                headers=headers,
+                timeout=30.0,
+                transport=self._build_transport(),
             )
         return self._client
+
+    def _build_transport(self) -> httpx.AsyncBaseTransport | None:
+        """Wrap the default transport in a rate limit and/or HTTP cache when configured.
+
+        Cache hits never wait for the rate limit. With several workers the disk
+        tier is always used, so the workers share one cache.
+        """
+        transport = None
+        if self.rate_limit:
+            transport = RateLimitedTransport(RateLimiter(self.name, self.rate_limit))
+        if self.cache_entries <= 0:
+            return transport
+        disk = None
+        if self.cache_persist or settings.workers != 1:
+            disk = self._disk = SqliteCache(
+                settings.cache_dir / "http.db",
+                namespace=self.name,
+                max_entries=self.cache_entries * 10,
+            )
+        cache = HttpCache(self.cache_entries, disk=disk)
+        metrics.register_cache(f"http:{self.name}", cache.memory)
+        if disk is not None:
+            metrics.register_cache(f"http:{self.name}:disk", disk)
+        return CachingTransport(cache, transport)
@@ -0,0 +1,104 @@
+"""
+JSON encoding for hot paths.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both produce compact UTF-8 JSON and stringify unknown types
+(like `json.dumps(..., default=str)`).
+
+`Encoded` is a dict that carries its own encoding. A tool output is encoded
+once when it is produced; later `dumps()` calls on turns containing it
+splice those bytes in instead of encoding the output again.
+"""
+
+import enum
+import itertools
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+__all__ = ["Encoded", "backend", "dumps", "dumps_str", "encoded", "loads"]
+
+backend = "orjson" if orjson is not None else "json"
+
+# Placeholder strings stand in for Encoded values during encoding; the
+# per-process nonce keeps them from colliding with real data.
+_NONCE = os.urandom(6).hex()
+_counter = itertools.count()
+
+
+class Encoded(dict):
+    """A dict plus its pre-computed JSON (`.json`, bytes)."""
+
+    __slots__ = ("json",)
+
+
+def encoded(value: dict[str, Any]) -> Encoded:
+    """Encode `value` once and return it as an Encoded dict."""
+    out = Encoded(value)
+    out.json = dumps(value)
+    return out
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    return str(obj)
+
+
+_encoder = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=_default
+)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Encode `obj` to JSON bytes, splicing in any Encoded values."""
+        spliced: dict[bytes, bytes] = {}
+
+        def default(value: Any) -> Any:
+            # Subclasses of builtins only reach here with OPT_PASSTHROUGH_SUBCLASS
+            if isinstance(value, Encoded):
+                key = f"\x00{_NONCE}:{next(_counter)}\x00"
+                spliced[orjson.dumps(key)] = value.json
+                return key
+            if isinstance(value, enum.Enum):
+                return value.value
+            for base in (dict, list, str, int, float):
+                if isinstance(value, base):
+                    return base(value)
+            return str(value)
+
+        try:
+            data = orjson.dumps(
+                obj, default=default, option=_OPTIONS | orjson.OPT_PASSTHROUGH_SUBCLASS
+            )
+        except orjson.JSONEncodeError:
+            # orjson rejects ints wider than 64 bits (e.g. calculator results);
+            # the standard library encodes them, just more slowly
+            return _encoder.encode(obj).encode("utf-8")
+        for key, raw in spliced.items():
+            data = data.replace(key, raw, 1)
+        return data
+
+    def loads(data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+else:
+    def dumps(obj: Any) -> bytes:
+        """Encode `obj` to JSON bytes."""
+        return _encoder.encode(obj).encode("utf-8")
+
+    def loads(data: str | bytes) -> Any:
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    """dumps() as str, e.g. for SQLite TEXT columns or MCP text content."""
+    return dumps(obj).decode("utf-8")
@@ -0,0 +1,170 @@
+"""
+Production entry point: several uvicorn workers sharing one listening socket.
+
+    python -m app.serve [--workers N] [--host H] [--port P]
+
+The supervisor loads the tool registry once and binds the socket, then forks
+the workers, so tool modules are imported a single time and shared
+copy-on-write. Workers that die are replaced. On SIGTERM/SIGINT every worker
+stops accepting connections and gets settings.shutdown_timeout seconds to
+finish in-flight requests and streams before it is killed.
+
+HTTP caches and rate limits are shared between workers through SQLite
+(see app.cache and app.ratelimit); each worker publishes its metrics to
+cache_dir/metrics and /metrics merges them. For development
+use `uvicorn app.main:app --reload` instead.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from .config import settings
+
+logger = logging.getLogger("app.serve")
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket) -> None:
+    """Body of a forked worker; never returns."""
+    from .main import app
+
+    # Own process group: a terminal Ctrl+C reaches only the supervisor, which
+    # then stops each worker exactly once (a second signal would skip draining)
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        timeout_graceful_shutdown=settings.shutdown_timeout,
+        log_level="debug" if settings.debug else "info",
+    )
+    server = uvicorn.Server(config)
+    code = 0
+    try:
+        server.run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %d crashed", os.getpid())
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+class Supervisor:
+    def __init__(self, sock: socket.socket, workers: int) -> None:
+        self.sock = sock
+        self.workers = workers
+        self.children: set[int] = set()
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self.sock)
+        self.children.add(pid)
+        logger.info("Started worker %d", pid)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            self._recover_jobs(pid)
+            if self.stopping:
+                continue
+            logger.warning(
+                "Worker %d exited (status %d); restarting", pid, os.waitstatus_to_exitcode(status)
+            )
+            time.sleep(0.5)  # don't spin if workers crash on start
+            self.spawn()
+        logger.info("All workers stopped")
+
+    def _stop(self, signum, frame) -> None:
+        if self.stopping:
+            # Second signal: stop waiting for streams
+            for pid in self.children:
+                os.kill(pid, signal.SIGKILL)
+            return
+        self.stopping = True
+        logger.info("Draining %d workers (up to %.0fs)", len(self.children), settings.shutdown_timeout)
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        signal.signal(signal.SIGALRM, self._kill)
+        signal.alarm(int(settings.shutdown_timeout) + 5)
+
+    def _kill(self, signum, frame) -> None:
+        for pid in self.children:
+            logger.warning("Worker %d did not drain in time; killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+
+    @staticmethod
+    def _recover_jobs(pid: int) -> None:
+        from .jobs import jobs
+
+        count = jobs.recover(pid)
+        if count:
+            logger.info("Re-queued %d jobs of worker %d", count, pid)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    workers = args.workers or os.cpu_count() or 1
+    # Read by modules that pick shared (SQLite) state over per-process state
+    settings.workers = workers
+
+    # Preload before forking: tool modules, app routes, job recovery
+    from .jobs import jobs
+    from .registry import registry
+    from . import main as _app
+
+    # Metric snapshots of a previous run's workers
+    for stale in _app.METRICS_DIR.glob("*.json"):
+        stale.unlink(missing_ok=True)
+
+    registry.load_tools(settings.tools_dir)
+    logger.info("Preloaded %d tools from %d servers", len(registry.list_tools()), len(registry.list_servers()))
+    count = jobs.recover()
+    if count:
+        logger.info("Re-queued %d unfinished jobs", count)
+    jobs.recover_on_start = False
+
+    sock = _bind(args.host, args.port)
+    logger.info("Listening on http://%s:%d with %d workers", args.host, args.port, workers)
+    Supervisor(sock, workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Server-side trajectory store (SQLite, turns kept as JSON).
+
+Each trajectory is indexed by prompt hash, model, source, tools used, turn
+and tool-call counts and duration, so runs can be listed, filtered and
+compared without loading whole export files. Prompts are stored once and
+referenced by hash.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from .config import settings
+from .db import connect
+from .serialization import dumps_str
+
+_SUMMARY_COLUMNS = (
+    "t.id, t.prompt_hash, t.name, t.source, t.model, t.turn_count,"
+    " t.tool_call_count, t.duration_ms, t.created_at, t.tools"
+)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def _model_name(model: Any) -> str | None:
+    """The UI stores either a model id or {base_url, model_name}."""
+    if isinstance(model, dict):
+        return model.get("model_name") or model.get("model")
+    return model or None
+
+
+def _tool_names(turns: list[dict[str, Any]]) -> list[str]:
+    return [
+        f"{tc.get('server', '')}.{tc.get('tool', '')}"
+        for turn in turns
+        for tc in turn.get("tool_calls") or []
+    ]
+
+
+class TrajectoryStore:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            with self._conn:
+                self._conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS prompts (
+                        hash TEXT PRIMARY KEY,
+                        prompt TEXT NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS trajectories (
+                        id TEXT PRIMARY KEY,
+                        prompt_hash TEXT NOT NULL REFERENCES prompts (hash),
+                        name TEXT,
+                        source TEXT,
+                        model TEXT,
+                        turn_count INTEGER NOT NULL,
+                        tool_call_count INTEGER NOT NULL,
+                        duration_ms REAL,
+                        created_at REAL NOT NULL,
+                        tools TEXT NOT NULL,
+                        turns TEXT NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS traj_created ON trajectories (created_at);
+                    CREATE INDEX IF NOT EXISTS traj_prompt ON trajectories (prompt_hash, created_at);
+                    CREATE INDEX IF NOT EXISTS traj_model ON trajectories (model, created_at);
+                    CREATE INDEX IF NOT EXISTS traj_turns ON trajectories (turn_count);
+                    CREATE INDEX IF NOT EXISTS traj_duration ON trajectories (duration_ms);
+                    CREATE TABLE IF NOT EXISTS trajectory_tools (
+                        trajectory_id TEXT NOT NULL,
+                        tool TEXT NOT NULL,
+                        calls INTEGER NOT NULL,
+                        PRIMARY KEY (trajectory_id, tool)
+                    );
+                    CREATE INDEX IF NOT EXISTS traj_tools_tool ON trajectory_tools (tool);
+                    """
+                )
+        return self._conn
+
+    # -- writes -------------------------------------------------------------
+    def add(
+        self,
+        prompt: str,
+        trajectory: dict[str, Any],
+        duration_ms: float | None = None,
+    ) -> str:
+        """Store one trajectory ({name, source, model, turns}). Returns its id."""
+        return self.add_many([(prompt, trajectory)], duration_ms)[0]
+
+    def add_many(
+        self,
+        items: list[tuple[str, dict[str, Any]]],
+        duration_ms: float | None = None,
+    ) -> list[str]:
+        """Store (prompt, trajectory) pairs in one transaction. Returns their ids."""
+        db = self._db()
+        with self._lock, db:
+            return [self._insert(db, prompt, t, duration_ms) for prompt, t in items]
+
+    def add_document(self, document: dict[str, Any]) -> list[str]:
+        """Store an exported {"prompt", "trajectories": [...]} document."""
+        prompt = document.get("prompt", "")
+        return self.add_many([(prompt, t) for t in document.get("trajectories", [])])
+
+    @staticmethod
+    def _insert(
+        db: Any, prompt: str, trajectory: dict[str, Any], duration_ms: float | None
+    ) -> str:
+        turns = trajectory.get("turns") or []
+        tools = _tool_names(turns)
+        traj_id = trajectory.get("id") or uuid.uuid4().hex
+        phash = prompt_hash(prompt)
+        db.execute(
+            "INSERT OR IGNORE INTO prompts (hash, prompt) VALUES (?, ?)",
+            (phash, prompt),
+        )
+        db.execute(
+            "INSERT OR REPLACE INTO trajectories (id, prompt_hash, name, source, model,"
+            " turn_count, tool_call_count, duration_ms, created_at, tools, turns)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                traj_id,
+                phash,
+                trajectory.get("name"),
+                trajectory.get("source"),
+                _model_name(trajectory.get("model")),
+                len(turns),
+                len(tools),
+                duration_ms if duration_ms is not None else trajectory.get("duration_ms"),
+                trajectory.get("created_at") or time.time(),
+                json.dumps(sorted(set(tools))),
+                dumps_str(turns),
+            ),
+        )
+        db.execute("DELETE FROM trajectory_tools WHERE trajectory_id = ?", (traj_id,))
+        db.executemany(
+            "INSERT INTO trajectory_tools (trajectory_id, tool, calls) VALUES (?, ?, ?)",
+            [(traj_id, tool, n) for tool, n in Counter(tools).items()],
+        )
+        return traj_id
+
+    def delete(self, traj_id: str) -> bool:
+        db = self._db()
+        with self._lock, db:
+            db.execute("DELETE FROM trajectory_tools WHERE trajectory_id = ?", (traj_id,))
+            return db.execute(
+                "DELETE FROM trajectories WHERE id = ?", (traj_id,)
+            ).rowcount > 0
+
+    # -- reads --------------------------------------------------------------
+    def query(
+        self,
+        prompt_hash: str | None = None,
+        model: str | None = None,
+        source: str | None = None,
+        tool: str | None = None,
+        min_turns: int | None = None,
+        max_turns: int | None = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> tuple[int, list[dict[str, Any]]]:
+        """Summaries (no turns) matching every given filter, newest first."""
+        clause, params = self._where(prompt_hash, model, source, tool, min_turns, max_turns)
+
+        db = self._db()
+        with self._lock:
+            total = db.execute(
+                f"SELECT COUNT(*) FROM trajectories t{clause}", params
+            ).fetchone()[0]
+            rows = db.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM trajectories t{clause}"
+                " ORDER BY t.created_at DESC LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        return total, [self._summary(r) for r in rows]
+
+    def iter_full(self, batch_size: int = 100, **filters: Any) -> Iterator[dict[str, Any]]:
+        """Every matching trajectory with prompt and turns, newest first.
+
+        Rows are fetched `batch_size` at a time (keyset paging on created_at,
+        id) so a full export never holds more than one batch in memory.
+        """
+        clause, params = self._where(**filters)
+        cursor: tuple[float, str] | None = None
+        db = self._db()
+        while True:
+            page_clause, page_params = clause, list(params)
+            if cursor is not None:
+                page_clause += " AND " if page_clause else " WHERE "
+                page_clause += "(t.created_at < ? OR (t.created_at = ? AND t.id < ?))"
+                page_params += [cursor[0], cursor[0], cursor[1]]
+            with self._lock:
+                rows = db.execute(
+                    f"SELECT {_SUMMARY_COLUMNS}, t.turns, p.prompt FROM trajectories t"
+                    f" JOIN prompts p ON p.hash = t.prompt_hash{page_clause}"
+                    " ORDER BY t.created_at DESC, t.id DESC LIMIT ?",
+                    [*page_params, batch_size],
+                ).fetchall()
+            for row in rows:
+                yield {**self._summary(row), "prompt": row["prompt"], "turns": json.loads(row["turns"])}
+            if len(rows) < batch_size:
+                return
+            cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+    def get(self, traj_id: str) -> dict[str, Any] | None:
+        db = self._db()
+        with self._lock:
+            row = db.execute(
+                f"SELECT {_SUMMARY_COLUMNS}, t.turns, p.prompt FROM trajectories t"
+                " JOIN prompts p ON p.hash = t.prompt_hash WHERE t.id = ?",
+                (traj_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {**self._summary(row), "prompt": row["prompt"], "turns": json.loads(row["turns"])}
+
+    def compare(self, ids: list[str]) -> list[dict[str, Any]]:
+        """Summaries plus the per-turn tool sequence of each trajectory."""
+        out: list[dict[str, Any]] = []
+        for traj_id in ids:
+            traj = self.get(traj_id)
+            if traj is None:
+                continue
+            turns = traj.pop("turns")
+            traj.pop("prompt")
+            traj["tool_sequence"] = [
+                [f"{tc.get('server')}.{tc.get('tool')}" for tc in t.get("tool_calls") or []]
+                for t in turns
+            ]
+            out.append(traj)
+        return out
+
+    def prompts(self, limit: int = 50, offset: int = 0) -> list[dict[str, Any]]:
+        """Prompts with how many trajectories each has."""
+        db = self._db()
+        with self._lock:
+            rows = db.execute(
+                "SELECT p.hash, substr(p.prompt, 1, 200) AS preview, COUNT(t.id) AS trajectories"
+                " FROM prompts p LEFT JOIN trajectories t ON t.prompt_hash = p.hash"
+                " GROUP BY p.hash ORDER BY MAX(t.created_at) DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    def _where(
+        prompt_hash: str | None = None,
+        model: str | None = None,
+        source: str | None = None,
+        tool: str | None = None,
+        min_turns: int | None = None,
+        max_turns: int | None = None,
+    ) -> tuple[str, list[Any]]:
+        where: list[str] = []
+        params: list[Any] = []
+        for column, value in (
+            ("t.prompt_hash", prompt_hash),
+            ("t.model", model),
+            ("t.source", source),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if tool is not None:
+            where.append(
+                "t.id IN (SELECT trajectory_id FROM trajectory_tools WHERE tool = ?)"
+            )
+            params.append(tool)
+        if min_turns is not None:
+            where.append("t.turn_count >= ?")
+            params.append(min_turns)
+        if max_turns is not None:
+            where.append("t.turn_count <= ?")
+            params.append(max_turns)
+        return (f" WHERE {' AND '.join(where)}" if where else ""), params
+
+    @staticmethod
+    def _summary(row: Any) -> dict[str, Any]:
+        return {
+            "id": row["id"],
+            "prompt_hash": row["prompt_hash"],
+            "name": row["name"],
+            "source": row["source"],
+            "model": row["model"],
+            "turn_count": row["turn_count"],
+            "tool_call_count": row["tool_call_count"],
+            "duration_ms": row["duration_ms"],
+            "created_at": row["created_at"],
+            "tools": json.loads(row["tools"]),
+        }
+
+
+store = TrajectoryStore(settings.data_dir / "trajectories.db")
@@ -0,0 +1,267 @@
+"""
+Span-based tracing for agent runs, tool calls and MCP requests.
+
+    with tracer.span("tool_call", server="wikipedia", tool="search") as span:
+        span.set("result_bytes", 1234)
+
+The current span lives in a contextvar, so spans opened inside it (including
+in tasks created there) become its children. Async generators must not hold
+a current span across `yield` — use start_span()/end_span() for the outer
+span and `span(..., parent=...)` for the work between yields.
+
+When the root span of a trace ends, the whole trace is written by the
+configured exporter (settings.trace_exporter):
+
+    chrome — one Chrome trace-event file per trace in settings.trace_dir
+             (open in https://ui.perfetto.dev or chrome://tracing)
+    otlp   — OTLP/JSON, one trace per line, appended to trace_dir/traces.jsonl
+             (the OpenTelemetry collector's file format)
+
+With no exporter, spans are no-ops. A trace whose root span is never ended
+(a leaked start_span) is dropped after `max_age` seconds.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from .config import settings
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    recording = True
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+        "attributes", "status", "error", "track",
+    )
+
+    def __init__(self, name: str, parent: "Span | None", attributes: dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: str | None = None
+        self.track = _track_id()
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+class _NoopSpan:
+    """Stand-in when tracing is off, so call sites need no checks."""
+
+    recording = False
+    trace_id = span_id = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _track_id() -> int:
+    """Row in the flame chart: one per asyncio task (or thread)."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+# -- exporters --------------------------------------------------------------
+
+class ChromeTraceExporter:
+    """Chrome trace-event JSON ("X" complete events), one file per trace."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def export(self, spans: list[Span]) -> None:
+        tracks: dict[int, int] = {}
+        events = []
+        for s in sorted(spans, key=lambda s: s.start_ns):
+            tid = tracks.setdefault(s.track, len(tracks) + 1)
+            events.append({
+                "name": s.name,
+                "cat": s.name.split(".")[0],
+                "ph": "X",
+                "ts": s.start_ns / 1000,
+                "dur": (s.end_ns - s.start_ns) / 1000,
+                "pid": 1,
+                "tid": tid,
+                "args": {**s.attributes, "status": s.status, **({"error": s.error} if s.error else {})},
+            })
+        root = next((s for s in spans if s.parent_id is None), spans[0])
+        path = self.directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{root.name}-{root.trace_id[:8]}.json"
+        path.write_bytes(dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+
+class OtlpFileExporter:
+    """OTLP/JSON (ExportTraceServiceRequest per line) appended to one file."""
+
+    _STATUS = {"ok": 1, "error": 2, "cancelled": 2}
+
+    def __init__(self, directory: Path, service_name: str = "tool-use") -> None:
+        self.path = directory / "traces.jsonl"
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _value(value: Any) -> dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def export(self, spans: list[Span]) -> None:
+        otlp_spans = []
+        for s in spans:
+            span: dict[str, Any] = {
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 1,  # INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": [
+                    {"key": k, "value": self._value(v)} for k, v in s.attributes.items()
+                ],
+                "status": {"code": self._STATUS[s.status], **({"message": s.error} if s.error else {})},
+            }
+            if s.parent_id:
+                span["parentSpanId"] = s.parent_id
+            otlp_spans.append(span)
+        line = dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}},
+                ]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+            }]
+        })
+        with self._lock, open(self.path, "ab") as f:
+            f.write(line + b"\n")
+
+
+_EXPORTERS = {"chrome": ChromeTraceExporter, "otlp": OtlpFileExporter}
+
+
+# -- tracer -----------------------------------------------------------------
+
+class Tracer:
+    def __init__(
+        self, exporter: str = "", directory: str | Path = "traces", max_age: float = 3600.0
+    ) -> None:
+        self.exporter = None
+        if exporter:
+            if exporter not in _EXPORTERS:
+                raise ValueError(f"Unknown trace exporter {exporter!r} (expected one of {sorted(_EXPORTERS)})")
+            directory = Path(directory)
+            directory.mkdir(parents=True, exist_ok=True)
+            self.exporter = _EXPORTERS[exporter](directory)
+        # trace id -> (root start, finished spans), for traces whose root is
+        # still open; oldest first
+        self._pending: dict[str, tuple[float, list[Span]]] = {}
+        self._lock = threading.Lock()
+        self.max_age = max_age
+        self._next_sweep = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def current_span(self) -> Span | None:
+        return _current.get()
+
+    def start_span(self, name: str, parent: Span | None = None, **attributes: Any) -> Span | _NoopSpan:
+        """Open a span without making it current (end it with end_span)."""
+        if self.exporter is None:
+            return _NOOP
+        parent = parent if parent is not None else _current.get()
+        span = Span(name, parent if isinstance(parent, Span) else None, attributes)
+        if span.parent_id is None:
+            now = time.monotonic()
+            with self._lock:
+                self._pending[span.trace_id] = (now, [])
+                if now >= self._next_sweep:
+                    self._expire(now)
+        return span
+
+    def _expire(self, now: float) -> None:
+        """Drop traces whose root has been open longer than max_age (lock held)."""
+        self._next_sweep = now + min(60.0, self.max_age)
+        expired = []
+        for trace_id, (started, _) in self._pending.items():
+            if now - started < self.max_age:
+                break
+            expired.append(trace_id)
+        for trace_id in expired:
+            del self._pending[trace_id]
+        if expired:
+            logger.warning("Dropped %d traces whose root span never ended", len(expired))
+
+    def end_span(self, span: Span | _NoopSpan, error: BaseException | None = None) -> None:
+        if not isinstance(span, Span):
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            cancelled = isinstance(error, (asyncio.CancelledError, GeneratorExit))
+            span.status = "cancelled" if cancelled else "error"
+            span.error = str(error) or type(error).__name__
+        with self._lock:
+            pending = self._pending.get(span.trace_id)
+            if pending is None:
+                return  # finished after its root was exported (or expired)
+            spans = pending[1]
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._pending[span.trace_id]
+        try:
+            self.exporter.export(spans)
+        except Exception:
+            logger.exception("Trace export failed")
+
+    @contextmanager
+    def span(self, name: str, parent: Span | None = None, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+        """Open a span, make it current for the body, and end it afterwards."""
+        if self.exporter is None:
+            yield _NOOP
+            return
+        span = self.start_span(name, parent, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current.reset(token)
+
+
+tracer = Tracer(settings.trace_exporter, settings.trace_dir)
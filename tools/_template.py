@@ -20,6 +20,9 @@ Option B — REST API (config only, zero code):
         base_url="https://api.example.com",
         # auth_type="bearer",       # none | api_key | bearer
         # auth_env_var="MY_KEY",    # env var with the key
+        # cache_entries=256,        # HTTP cache (honours ETag/Cache-Control)
+        # cache_persist=True,       # keep cached responses across restarts
+        # rate_limit=1.0,           # max requests/second (shared by all workers)
     )
 
     server.get("tool_name", "/path/{param}",
@@ -28,4 +31,16 @@ Option B — REST API (config only, zero code):
             "param": {"type": "string", "required": True, "location": "path"},
         },
     )
+
+    # Lazily follow cursor/offset/page pagination up to max_items:
+    server.get("list_items", "/items",
+        paginate={"type": "cursor", "items": "data", "cursor_path": "next",
+                  "cursor_param": "cursor", "max_items": 50},
+    )
+
+    # Fold a list argument into one upstream call (e.g. ids=1,2,3):
+    server.get("get_items", "/items",
+        parameters={"ids": {"required": True, "location": "query"}},
+        batch={"param": "ids", "separator": ",", "max_size": 50},
+    )
 """
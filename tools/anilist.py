@@ -1,41 +1,203 @@
-"""AniList — anime, manga, characters search. No API key needed."""
+"""AniList — anime, manga, characters search. No API key needed.
+
+AniList limits requests per minute, so calls share one rate limit that also
+backs off when the response headers say the budget is spent. Concurrent
+get_anime/get_character lookups are merged into one aliased GraphQL query,
+and entities are cached by id.
+"""
+
+import time
+from functools import lru_cache
 
 import httpx
 
+from app.batching import Coalescer
+from app.cache import SqliteCache, TTLCache
+from app.config import settings
+from app.metrics import metrics
+from app.ratelimit import RateLimiter
 from app.sdk import ToolServer
 
 server = ToolServer("anilist", "AniList — search anime, characters, and staff")
 
 _API = "https://graphql.anilist.co"
 
+# 90 requests a minute when AniList is healthy (it drops to 30 when degraded;
+# the headers tell us, see _pace)
+_limiter = RateLimiter("anilist", rate=90 / 60, burst=5)
+_MAX_WAIT = 30  # longer Retry-After waits fail the call instead
+_MAX_BATCH = 10  # keeps a batched query under AniList's complexity limit
 
-async def _gql(query: str, variables: dict | None = None) -> dict:
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.post(
-            _API, json={"query": query, "variables": variables or {}}
-        )
-        return resp.json()
+_client: httpx.AsyncClient | None = None
 
 
-@server.register("search_anime", description="Search for anime by title")
-async def search_anime(term: str) -> dict:
-    data = await _gql(
-        """
-        query ($search: String) {
-            Page(perPage: 5) {
-                media(search: $search, type: ANIME) {
-                    id
-                    title { romaji english }
-                    episodes status averageScore
-                    genres
-                    description(asHtml: false)
-                }
+def _compact(query: str) -> str:
+    """Collapse whitespace once at import, so every request sends the short form."""
+    return " ".join(query.split())
+
+
+# -- queries ----------------------------------------------------------------
+
+_SEARCH_ANIME = _compact("""
+    query ($search: String) {
+        Page(perPage: 5) {
+            media(search: $search, type: ANIME) {
+                id
+                title { romaji english }
+                episodes status averageScore
+                genres
+                description(asHtml: false)
             }
         }
-        """,
-        {"search": term},
+    }
+""")
+
+_SEARCH_CHARACTER = _compact("""
+    query ($search: String) {
+        Page(perPage: 5) {
+            characters(search: $search) {
+                id
+                name { full native }
+                description(asHtml: false)
+                media { nodes { title { romaji } } }
+            }
+        }
+    }
+""")
+
+_SEARCH_STAFF = _compact("""
+    query ($search: String) {
+        Page(perPage: 5) {
+            staff(search: $search) {
+                id
+                name { full native }
+                primaryOccupations
+                description(asHtml: false)
+            }
+        }
+    }
+""")
+
+# Lookup kind -> (root field, extra arguments, selection)
+_LOOKUPS = {
+    "anime": ("Media", ", type: ANIME", _compact("""
+        id
+        title { romaji english native }
+        description(asHtml: false)
+        episodes duration status season seasonYear
+        averageScore meanScore
+        genres
+        studios { nodes { name } }
+        startDate { year month day }
+        endDate { year month day }
+    """)),
+    "character": ("Character", "", _compact("""
+        id
+        name { full native alternative }
+        description(asHtml: false)
+        gender age bloodType
+        media { nodes { title { romaji english } type } }
+    """)),
+}
+
+
+@lru_cache(maxsize=256)
+def _batch_query(kinds: tuple[str, ...]) -> str:
+    """One aliased query fetching an entity per kind: a0: Media(id: $id0) {...} a1: ..."""
+    params = ", ".join(f"$id{i}: Int" for i in range(len(kinds)))
+    fields = " ".join(
+        f"a{i}: {root}(id: $id{i}{args}) {{ {selection} }}"
+        for i, (root, args, selection) in enumerate(_LOOKUPS[k] for k in kinds)
     )
-    media = data.get("data", {}).get("Page", {}).get("media", [])
+    return f"query ({params}) {{ {fields} }}"
+
+
+# -- transport --------------------------------------------------------------
+
+class _RateLimited(Exception):
+    pass
+
+
+def _http() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=15)
+    return _client
+
+
+def _pace(resp: httpx.Response) -> None:
+    """Hold back further calls when AniList reports the minute's budget is spent."""
+    headers = resp.headers
+    if resp.status_code == 429:
+        _limiter.pause(float(headers.get("Retry-After", 60)))
+    elif headers.get("X-RateLimit-Remaining") == "0":
+        reset = headers.get("X-RateLimit-Reset")
+        _limiter.pause(float(reset) - time.time() if reset else 60)
+
+
+async def _gql(query: str, variables: dict | None = None) -> dict:
+    for _ in range(2):
+        async with _limiter:
+            resp = await _http().post(
+                _API, json={"query": query, "variables": variables or {}}
+            )
+        _pace(resp)
+        if resp.status_code != 429:
+            # Partial "Not Found." errors come with a 404 but still carry data
+            return resp.json()
+        if float(resp.headers.get("Retry-After", 60)) > _MAX_WAIT:
+            break
+    raise _RateLimited("AniList rate limit — retry in a minute")
+
+
+# -- caches + batched lookups -----------------------------------------------
+
+_entities = SqliteCache(settings.cache_dir / "tools.db", namespace="anilist", ttl=86400)
+_searches = TTLCache(max_entries=256, ttl=600)
+metrics.register_cache("anilist:entities", _entities)
+metrics.register_cache("anilist:searches", _searches)
+
+
+async def _fetch_entities(keys: list[str]) -> dict[str, dict]:
+    """Fetch 'kind:id' keys in one query; ids AniList doesn't know are left out."""
+    keys = sorted(keys)  # canonical kind order, so _batch_query hits its cache
+    kinds = tuple(k.split(":")[0] for k in keys)
+    variables = {f"id{i}": int(k.split(":")[1]) for i, k in enumerate(keys)}
+    data = (await _gql(_batch_query(kinds), variables)).get("data") or {}
+    return {k: data[f"a{i}"] for i, k in enumerate(keys) if data.get(f"a{i}")}
+
+
+_lookups = Coalescer(_fetch_entities, window=0.02, max_batch=_MAX_BATCH, cache=_entities)
+
+
+@server.on_close
+async def _close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _entities.close()
+    _limiter.close()
+
+
+async def _search(kind: str, query: str, term: str) -> list[dict]:
+    key = f"{kind}:{' '.join(term.casefold().split())}"
+    found = _searches.get(key)
+    if found is None:
+        data = await _gql(query, {"search": term})
+        found = ((data.get("data") or {}).get("Page") or {}).get(kind) or []
+        _searches.set(key, found)
+    return found
+
+
+# -- tools ------------------------------------------------------------------
+
+@server.register("search_anime", description="Search for anime by title")
+async def search_anime(term: str) -> dict:
+    try:
+        media = await _search("media", _SEARCH_ANIME, term)
+    except _RateLimited as e:
+        return {"error": str(e)}
     return {
         "result": [
             {
@@ -54,47 +216,20 @@ async def search_anime(term: str) -> dict:
 
 @server.register("get_anime", description="Get detailed info about an anime by ID")
 async def get_anime(id: int) -> dict:
-    data = await _gql(
-        """
-        query ($id: Int) {
-            Media(id: $id, type: ANIME) {
-                id
-                title { romaji english native }
-                description(asHtml: false)
-                episodes duration status season seasonYear
-                averageScore meanScore
-                genres
-                studios { nodes { name } }
-                startDate { year month day }
-                endDate { year month day }
-            }
-        }
-        """,
-        {"id": id},
-    )
-    return {"result": data.get("data", {}).get("Media", {})}
+    try:
+        return {"result": await _lookups.get(f"anime:{int(id)}") or {}}
+    except _RateLimited as e:
+        return {"error": str(e)}
 
 
 @server.register(
     "search_character", description="Search for anime/manga characters by name"
 )
 async def search_character(term: str) -> dict:
-    data = await _gql(
-        """
-        query ($search: String) {
-            Page(perPage: 5) {
-                characters(search: $search) {
-                    id
-                    name { full native }
-                    description(asHtml: false)
-                    media { nodes { title { romaji } } }
-                }
-            }
-        }
-        """,
-        {"search": term},
-    )
-    chars = data.get("data", {}).get("Page", {}).get("characters", [])
+    try:
+        chars = await _search("characters", _SEARCH_CHARACTER, term)
+    except _RateLimited as e:
+        return {"error": str(e)}
     return {
         "result": [
             {
@@ -116,41 +251,18 @@ async def search_character(term: str) -> dict:
     "get_character", description="Get detailed info about a character by ID"
 )
 async def get_character(id: int) -> dict:
-    data = await _gql(
-        """
-        query ($id: Int) {
-            Character(id: $id) {
-                id
-                name { full native alternative }
-                description(asHtml: false)
-                gender age bloodType
-                media { nodes { title { romaji english } type } }
-            }
-        }
-        """,
-        {"id": id},
-    )
-    return {"result": data.get("data", {}).get("Character", {})}
+    try:
+        return {"result": await _lookups.get(f"character:{int(id)}") or {}}
+    except _RateLimited as e:
+        return {"error": str(e)}
 
 
 @server.register("search_staff", description="Search for anime staff/voice actors")
 async def search_staff(term: str) -> dict:
-    data = await _gql(
-        """
-        query ($search: String) {
-            Page(perPage: 5) {
-                staff(search: $search) {
-                    id
-                    name { full native }
-                    primaryOccupations
-                    description(asHtml: false)
-                }
-            }
-        }
-        """,
-        {"search": term},
-    )
-    staff = data.get("data", {}).get("Page", {}).get("staff", [])
+    try:
+        staff = await _search("staff", _SEARCH_STAFF, term)
+    except _RateLimited as e:
+        return {"error": str(e)}
     return {
         "result": [
             {
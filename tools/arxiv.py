@@ -1,15 +1,35 @@
-"""arXiv — search and read academic papers. No API key needed."""
+"""arXiv — search and read academic papers. No API key needed.
 
+arXiv asks API clients to wait 3 seconds between requests, so every call
+goes through one shared rate limit. Concurrent read_paper lookups are merged
+into a single id_list request and papers are cached by id.
+"""
+
+import re
 import xml.etree.ElementTree as ET
+from collections.abc import AsyncIterator
 
 import httpx
 
+from app.batching import Coalescer
+from app.cache import SqliteCache
+from app.config import settings
+from app.metrics import metrics
+from app.ratelimit import RateLimiter
 from app.sdk import ToolServer
 
 server = ToolServer("arxiv", "Search and read academic papers from arXiv")
 
 _API = "http://export.arxiv.org/api/query"
 _NS = {"atom": "http://www.w3.org/2005/Atom"}
+_ENTRY = "{http://www.w3.org/2005/Atom}entry"
+
+_limiter = RateLimiter("arxiv", rate=1 / 3)
+
+# New-style (2301.07041, 2301.07041v2) and old-style (hep-th/9901001) ids.
+# Checked up front: one malformed id makes arXiv reject a whole id_list.
+_ID = re.compile(r"^(\d{4}\.\d{4,5}|[a-z][a-z.-]*/\d{7})(v\d+)?$", re.IGNORECASE)
+_MAX_IDS = 50
 
 
 def _text(el, tag):
@@ -40,6 +60,56 @@ def _parse_entry(entry):
     }
 
 
+class _RateLimited(Exception):
+    pass
+
+
+async def _query(params: dict) -> AsyncIterator[dict]:
+    """Yield parsed entries as the Atom feed arrives."""
+    async with _limiter, httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
+        async with client.stream("GET", _API, params=params) as resp:
+            if resp.status_code == 429:
+                raise _RateLimited("arXiv rate limit — retry in a few seconds")
+            resp.raise_for_status()
+            parser = ET.XMLPullParser(events=("end",))
+            async for chunk in resp.aiter_bytes():
+                parser.feed(chunk)
+                for _, el in parser.read_events():
+                    if el.tag == _ENTRY:
+                        if not _text(el, "atom:id").startswith("http://arxiv.org/api/errors"):
+                            yield _parse_entry(el)
+                        el.clear()
+
+
+def _base_id(paper_id: str) -> str:
+    return re.sub(r"v\d+$", "", paper_id)
+
+
+# -- paper cache + batched lookups ------------------------------------------
+
+_papers = SqliteCache(settings.cache_dir / "tools.db", namespace="arxiv", ttl=7 * 86400)
+metrics.register_cache("arxiv:papers", _papers)
+
+
+async def _fetch_papers(ids: list[str]) -> dict[str, dict]:
+    found: dict[str, dict] = {}
+    async for paper in _query({"id_list": ",".join(ids), "max_results": len(ids)}):
+        # "2301.07041" comes back as "2301.07041v3"
+        found[paper["id"]] = found[_base_id(paper["id"])] = paper
+    return found
+
+
+_lookups = Coalescer(_fetch_papers, window=0.05, max_batch=_MAX_IDS, cache=_papers)
+
+
+@server.on_close
+def _close() -> None:
+    _papers.close()
+    _limiter.close()
+
+
+# -- tools ------------------------------------------------------------------
+
 @server.register("search_papers", description="Search for academic papers on arXiv")
 async def search_papers(
     query: str, max_results: int = 5, categories: str = ""
@@ -48,31 +118,50 @@ async def search_papers(
     if categories:
         search_query += f" AND cat:{categories}"
 
-    async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
-        resp = await client.get(
-            _API,
-            params={
-                "search_query": search_query,
-                "max_results": max_results,
-                "sortBy": "relevance",
-            },
-        )
-        if resp.status_code == 429:
-            return {"error": "arXiv rate limit — retry in a few seconds"}
-        resp.raise_for_status()
-        root = ET.fromstring(resp.text)
-        return {"result": [_parse_entry(e) for e in root.findall("atom:entry", _NS)]}
-
-
-@server.register("read_paper", description="Get full details of a paper by arXiv ID")
-async def read_paper(paper_id: str) -> dict:
-    # Accept both "2301.07041" and full URL
-    paper_id = paper_id.split("/abs/")[-1].strip()
-
-    async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
-        resp = await client.get(_API, params={"id_list": paper_id})
-        root = ET.fromstring(resp.text)
-        entry = root.find("atom:entry", _NS)
-        if entry is None:
+    params = {"search_query": search_query, "max_results": max_results, "sortBy": "relevance"}
+    try:
+        papers = [paper async for paper in _query(params)]
+    except _RateLimited as e:
+        return {"error": str(e)}
+    for paper in papers:
+        _papers.set(_base_id(paper["id"]), paper)
+    return {"result": papers}
+
+
+@server.register(
+    "read_paper",
+    description="Get full details of papers by arXiv ID",
+    parameters={
+        "paper_id": {"type": "string", "required": False, "description": "arXiv ID or abs URL"},
+        "paper_ids": {
+            "type": "array",
+            "items": {"type": "string"},
+            "required": False,
+            "description": f"Several arXiv IDs (up to {_MAX_IDS}), fetched in one request",
+        },
+    },
+)
+async def read_paper(paper_id: str = "", paper_ids: list[str] | None = None) -> dict:
+    # Accept both "2301.07041" and full URLs
+    requested = [paper_id] if paper_id else []
+    requested += paper_ids or []
+    ids = list(dict.fromkeys(p.split("/abs/")[-1].strip() for p in requested if p.strip()))
+    if not ids:
+        return {"error": "Give a paper_id or paper_ids"}
+    if len(ids) > _MAX_IDS:
+        return {"error": f"Too many ids ({len(ids)}, max {_MAX_IDS})"}
+
+    valid = [i for i in ids if _ID.match(i)]
+    try:
+        found = await _lookups.get_many(valid)
+    except _RateLimited as e:
+        return {"error": str(e)}
+
+    if paper_id and not paper_ids:
+        if ids[0] not in found:
             return {"error": "Paper not found"}
-        return {"result": _parse_entry(entry)}
+        return {"result": found[ids[0]]}
+    return {
+        "result": [found[i] for i in ids if i in found],
+        "not_found": [i for i in ids if i not in found],
+    }
@@ -1,46 +1,302 @@
-"""Calculator — safe math evaluation. No external API needed."""
+"""Calculator — safe math evaluation. No external API needed.
+
+Expressions are parsed once into cached plans and checked against size
+limits before anything is evaluated, so `9**9**9` or deeply nested input
+fails fast instead of stalling the event loop. When a variable is given a
+list, the expression is evaluated over every element at once (with NumPy
+if it is installed).
+"""
 
 import ast
+import asyncio
+import functools
+import math
 import operator
+from collections.abc import Callable
+from typing import Any
 
 from app.sdk import ToolServer
 
+try:
+    import numpy as np
+except ImportError:  # batch mode falls back to a loop
+    np = None
+
 server = ToolServer("calculator", "Safe math calculator")
 
-# -- safe eval engine -------------------------------------------------------
+# -- limits -----------------------------------------------------------------
+
+_MAX_LENGTH = 2000  # characters, checked before parsing
+_MAX_NODES = 500  # AST nodes per expression; each is one evaluation step
+_MAX_DEPTH = 50
+_MAX_BITS = 4096  # largest integer an operation may produce
+_MAX_BATCH = 100_000  # elements per batch evaluation
+
+# -- function library -------------------------------------------------------
+
+_CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+def _round(x, digits=0):
+    return round(x, int(digits)) if digits else round(x)
+
+
+# name -> (scalar implementation, NumPy implementation)
+_FUNCTIONS: dict[str, tuple[Callable, str | Callable]] = {
+    "sqrt": (math.sqrt, "sqrt"),
+    "exp": (math.exp, "exp"),
+    "log": (math.log, lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base)),
+    "log10": (math.log10, "log10"),
+    "log2": (math.log2, "log2"),
+    "sin": (math.sin, "sin"),
+    "cos": (math.cos, "cos"),
+    "tan": (math.tan, "tan"),
+    "asin": (math.asin, "arcsin"),
+    "acos": (math.acos, "arccos"),
+    "atan": (math.atan, "arctan"),
+    "atan2": (math.atan2, "arctan2"),
+    "sinh": (math.sinh, "sinh"),
+    "cosh": (math.cosh, "cosh"),
+    "tanh": (math.tanh, "tanh"),
+    "hypot": (math.hypot, "hypot"),
+    "degrees": (math.degrees, "degrees"),
+    "radians": (math.radians, "radians"),
+    "abs": (abs, "abs"),
+    "floor": (math.floor, "floor"),
+    "ceil": (math.ceil, "ceil"),
+    "round": (_round, lambda x, digits=0: np.round(x, int(digits))),
+    "min": (min, lambda *xs: functools.reduce(np.minimum, xs)),
+    "max": (max, lambda *xs: functools.reduce(np.maximum, xs)),
+}
+
+# -- operators --------------------------------------------------------------
+
+
+def _check_int(value: Any) -> Any:
+    if isinstance(value, int) and value.bit_length() > _MAX_BITS:
+        raise ValueError("Result too large")
+    return value
+
+
+def _checked_pow(base, exp):
+    if isinstance(base, int) and isinstance(exp, int) and abs(base) > 1 and exp > 0:
+        if exp * math.log2(abs(base)) > _MAX_BITS:
+            raise ValueError("Result too large")
+    return base**exp
+
+
+def _checked_mul(a, b):
+    if isinstance(a, int) and isinstance(b, int) and a.bit_length() + b.bit_length() > _MAX_BITS:
+        raise ValueError("Result too large")
+    return a * b
+
 
 _OPS = {
     ast.Add: operator.add,
     ast.Sub: operator.sub,
     ast.Mult: operator.mul,
     ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
     ast.Mod: operator.mod,
     ast.Pow: operator.pow,
     ast.USub: operator.neg,
     ast.UAdd: operator.pos,
 }
+# Python ints grow without bound, in scalar evaluation and in the constant
+# parts of a batch expression alike; the checks let arrays pass straight through
+_CHECKED_OPS = {**_OPS, ast.Pow: _checked_pow, ast.Mult: _checked_mul}
+
+# -- plans ------------------------------------------------------------------
+
+# A plan step takes (variables, ops, functions) and returns the node's value
+Step = Callable[[dict[str, Any], dict, dict[str, Callable]], Any]
+
+
+class Plan:
+    __slots__ = ("expression", "run", "names")
+
+    def __init__(self, expression: str, run: Step, names: frozenset[str]) -> None:
+        self.expression = expression
+        self.run = run
+        self.names = names  # variables the expression reads
 
 
-def _eval_node(node: ast.AST) -> float:
-    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
-        return node.value
+@functools.lru_cache(maxsize=1024)
+def compile_expression(expression: str) -> Plan:
+    """Parse and validate once; raises ValueError for anything disallowed."""
+    if len(expression) > _MAX_LENGTH:
+        raise ValueError(f"Expression too long (max {_MAX_LENGTH} characters)")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, RecursionError) as e:
+        raise ValueError(f"Invalid expression: {e}") from None
+    nodes = sum(1 for _ in ast.walk(tree))
+    if nodes > _MAX_NODES:
+        raise ValueError(f"Expression too complex ({nodes} nodes, max {_MAX_NODES})")
+    names: set[str] = set()
+    run = _build(tree.body, 1, names)
+    return Plan(expression, run, frozenset(names))
+
+
+def _build(node: ast.AST, depth: int, names: set[str]) -> Step:
+    if depth > _MAX_DEPTH:
+        raise ValueError(f"Expression nested too deeply (max {_MAX_DEPTH})")
+    depth += 1
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Unsupported constant: {value!r}")
+        _check_int(value)
+        return lambda env, ops, fns: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in _CONSTANTS:
+            value = _CONSTANTS[name]
+            return lambda env, ops, fns: value
+        names.add(name)
+        return lambda env, ops, fns: env[name]
+
     if isinstance(node, ast.BinOp):
-        op = _OPS.get(type(node.op))
-        if not op:
-            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
-        return op(_eval_node(node.left), _eval_node(node.right))
+        op_type = type(node.op)
+        if op_type not in _OPS:
+            raise ValueError(f"Unsupported operator: {op_type.__name__}")
+        left, right = _build(node.left, depth, names), _build(node.right, depth, names)
+        return lambda env, ops, fns: ops[op_type](left(env, ops, fns), right(env, ops, fns))
+
     if isinstance(node, ast.UnaryOp):
-        op = _OPS.get(type(node.op))
-        if not op:
-            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
-        return op(_eval_node(node.operand))
+        op_type = type(node.op)
+        if op_type not in _OPS:
+            raise ValueError(f"Unsupported operator: {op_type.__name__}")
+        operand = _build(node.operand, depth, names)
+        return lambda env, ops, fns: ops[op_type](operand(env, ops, fns))
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS:
+            name = getattr(node.func, "id", type(node.func).__name__)
+            raise ValueError(f"Unknown function: {name} (available: {', '.join(_FUNCTIONS)})")
+        if node.keywords:
+            raise ValueError("Keyword arguments are not supported")
+        name = node.func.id
+        args = [_build(arg, depth, names) for arg in node.args]
+        return lambda env, ops, fns: fns[name](*(arg(env, ops, fns) for arg in args))
+
     raise ValueError(f"Unsupported expression: {type(node).__name__}")
 
 
+# -- evaluation -------------------------------------------------------------
+
+_SCALAR_FUNCTIONS = {name: scalar for name, (scalar, _) in _FUNCTIONS.items()}
+_VECTOR_FUNCTIONS = (
+    {name: getattr(np, vec) if isinstance(vec, str) else vec for name, (_, vec) in _FUNCTIONS.items()}
+    if np is not None
+    else {}
+)
+
+
+def evaluate(plan: Plan, variables: dict[str, Any]) -> Any:
+    result = _evaluate(plan, variables)
+    # Float arithmetic overflows to inf (1e308 * 10) instead of raising, and
+    # inf/nan have no JSON encoding
+    if _finite(result) is None:
+        raise ValueError("Result too large" if math.isinf(result) else "Result is not a number")
+    return result
+
+
+def _evaluate(plan: Plan, variables: dict[str, Any]) -> Any:
+    try:
+        return _check_int(plan.run(variables, _CHECKED_OPS, _SCALAR_FUNCTIONS))
+    except OverflowError:
+        raise ValueError("Result too large") from None
+    except ZeroDivisionError:
+        raise ValueError("Division by zero") from None
+    except TypeError as e:  # wrong number of function arguments
+        raise ValueError(str(e)) from None
+
+
+def evaluate_batch(plan: Plan, variables: dict[str, Any], size: int) -> list[Any]:
+    """Evaluate over `size` rows; list variables supply one value per row."""
+    if np is None:
+        rows = (
+            {k: v[i] if isinstance(v, list) else v for k, v in variables.items()}
+            for i in range(size)
+        )
+        return [_finite(_evaluate(plan, row)) for row in rows]
+
+    arrays = {
+        k: np.asarray(v, dtype=np.float64) if isinstance(v, list) else v
+        for k, v in variables.items()
+    }
+    try:
+        with np.errstate(all="ignore"):
+            result = plan.run(arrays, _CHECKED_OPS, _VECTOR_FUNCTIONS)
+    except OverflowError:
+        raise ValueError("Result too large") from None
+    except ZeroDivisionError:
+        raise ValueError("Division by zero") from None
+    except TypeError as e:
+        raise ValueError(str(e)) from None
+    result = np.broadcast_to(result, (size,))
+    return [_finite(x) for x in result.tolist()]
+
+
+def _finite(value: Any) -> Any:
+    """NaN and infinities (e.g. log(0) in a batch) become null."""
+    return value if isinstance(value, int) or math.isfinite(value) else None
+
+
+def _check_variables(plan: Plan, variables: dict[str, Any]) -> int | None:
+    """Validate variables; returns the batch size, or None for a scalar call."""
+    missing = plan.names - variables.keys()
+    if missing:
+        raise ValueError(f"Unknown name(s): {', '.join(sorted(missing))}")
+    size = None
+    for name, value in variables.items():
+        if name in _CONSTANTS or name in _FUNCTIONS:
+            raise ValueError(f"Variable name '{name}' is reserved")
+        values = value if isinstance(value, list) else [value]
+        if any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in values):
+            raise ValueError(f"Variable '{name}' must be a number or a list of numbers")
+        for v in values:
+            _check_int(v)
+        if isinstance(value, list):
+            if size is not None and len(value) != size:
+                raise ValueError("List variables must all have the same length")
+            size = len(value)
+    if size is not None and size > _MAX_BATCH:
+        raise ValueError(f"Batch too large ({size} values, max {_MAX_BATCH})")
+    return size
+
+
 # -- tool -------------------------------------------------------------------
 
-@server.register("calculate", description="Evaluate a mathematical expression")
-async def calculate(expression: str) -> dict:
-    tree = ast.parse(expression, mode="eval")
-    result = _eval_node(tree.body)
-    return {"result": result, "expression": expression}
+@server.register(
+    "calculate",
+    description=(
+        "Evaluate a mathematical expression. Supports + - * / // % **, "
+        f"the constants pi, e, tau and the functions {', '.join(_FUNCTIONS)}. "
+        "Give a variable a list of numbers to evaluate the expression for every value in one call "
+        "(e.g. unit conversions or tables)."
+    ),
+    parameters={
+        "expression": {
+            "type": "string",
+            "required": True,
+            "description": "Expression, e.g. 'sqrt(x**2 + y**2)' or 'round(c * 9 / 5 + 32, 1)'",
+        },
+        "variables": {
+            "type": "object",
+            "required": False,
+            "description": "Values for names in the expression: numbers, or equal-length lists of numbers",
+        },
+    },
+)
+async def calculate(expression: str, variables: dict[str, Any] | None = None) -> dict:
+    plan = compile_expression(expression)
+    variables = variables or {}
+    size = _check_variables(plan, variables)
+    if size is None:
+        return {"result": evaluate(plan, variables), "expression": expression}
+    results = await asyncio.to_thread(evaluate_batch, plan, variables, size)
+    return {"result": results, "count": size, "expression": expression}
@@ -1,22 +1,92 @@
 """DuckDuckGo — web search and page fetching. No API key needed."""
 
 import asyncio
+import codecs
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
+from urllib.parse import urldefrag
 
 import httpx
 from ddgs import DDGS
+from ddgs.exceptions import RatelimitException
 
+from app.cache import TTLCache
+from app.metrics import metrics
 from app.sdk import ToolServer
 
+logger = logging.getLogger(__name__)
+
 server = ToolServer("ddg-search", "Web search and content fetching via DuckDuckGo")
 
 
+# -- search -----------------------------------------------------------------
+
+# DDGS is blocking. Searches run on their own small pool so they neither
+# starve nor are starved by other to_thread work, and each pool thread keeps
+# one long-lived DDGS session (it caches its search engine clients).
+_SEARCH_THREADS = 4
+_SEARCH_TIMEOUT = 20.0  # seconds per query, including rate-limit retries
+_RATE_LIMIT_RETRIES = 3
+_MAX_BACKOFF = 30.0
+
+_executor = ThreadPoolExecutor(max_workers=_SEARCH_THREADS, thread_name_prefix="ddg-search")
+_local = threading.local()
+server.on_close(lambda: _executor.shutdown(wait=False, cancel_futures=True))
+
+# Results by (query, max_results); set the TTL to 0 to turn caching off
+_RESULT_TTL = 600
+_results = TTLCache(max_entries=256, ttl=_RESULT_TTL)
+metrics.register_cache("ddg-search:results", _results)
+
+# After a rate-limit response every search waits until this time
+_backoff = 0.0
+_backoff_until = 0.0
+
+
+def _text_search(query: str, max_results: int) -> list[dict]:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = DDGS()
+    return list(session.text(query, max_results=max_results))
+
+
+async def _search_with_backoff(query: str, max_results: int) -> list[dict]:
+    global _backoff, _backoff_until
+    loop = asyncio.get_running_loop()
+    for attempt in range(_RATE_LIMIT_RETRIES + 1):
+        wait = _backoff_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            results = await loop.run_in_executor(_executor, _text_search, query, max_results)
+        except RatelimitException:
+            if attempt == _RATE_LIMIT_RETRIES:
+                raise
+            _backoff = min(max(2 * _backoff, 1.0), _MAX_BACKOFF)
+            _backoff_until = max(_backoff_until, time.monotonic() + _backoff)
+            logger.warning("DuckDuckGo rate limit; backing off %.0fs", _backoff)
+            continue
+        _backoff = 0.0
+        return results
+    raise AssertionError("unreachable")
+
+
 @server.register("search", description="Search the web using DuckDuckGo")
 async def search(query: str, max_results: int = 5) -> dict:
-    def _search():
-        return list(DDGS().text(query, max_results=max_results))
-
-    results = await asyncio.to_thread(_search)
+    key = f"{max_results}:{' '.join(query.lower().split())}"
+    results = _results.get(key) if _RESULT_TTL else None
+    if results is None:
+        try:
+            results = await asyncio.wait_for(
+                _search_with_backoff(query, max_results), _SEARCH_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Search timed out after {_SEARCH_TIMEOUT:.0f}s") from None
+        if _RESULT_TTL:
+            _results.set(key, results)
     return {
         "result": [
             {
@@ -29,36 +99,138 @@ async def search(query: str, max_results: int = 5) -> dict:
     }
 
 
+# -- page fetching ----------------------------------------------------------
+
+_MAX_CHARS = 2000  # default text returned per call
+_MAX_CHARS_LIMIT = 20_000
+_MAX_BYTES = 5_000_000  # stop downloading after this much, even if short of text
+_TEXT_TYPES = (
+    "text/html", "application/xhtml+xml", "text/plain", "text/markdown",
+    "text/xml", "application/xml", "application/json",
+)
+# Text not worth reading: code, and page chrome around the main content.
+# Not "form" (WebForms pages wrap all of <body> in one) nor "header" (the
+# <header> of an <article> holds its title and byline).
+_SKIP_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg",
+    "nav", "footer", "aside",
+})
+
+# Extracted page text by URL, so follow-up reads of a page don't re-fetch it:
+# url -> {"text": str, "complete": bool}. Incomplete entries hold a prefix.
+_documents = TTLCache(max_entries=64, ttl=900)
+metrics.register_cache("ddg-search:documents", _documents)
+
+
 class _TextExtractor(HTMLParser):
+    """Collects visible text; can be fed a page chunk by chunk."""
+
     def __init__(self):
         super().__init__()
         self.parts: list[str] = []
-        self._skip = False
+        self.chars = 0
+        self._skip = 0  # depth inside _SKIP_TAGS
 
     def handle_starttag(self, tag, attrs):
-        if tag in ("script", "style", "noscript"):
-            self._skip = True
+        if tag in _SKIP_TAGS:
+            self._skip += 1
 
     def handle_endtag(self, tag):
-        if tag in ("script", "style", "noscript"):
-            self._skip = False
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
 
     def handle_data(self, data):
         if not self._skip:
             t = data.strip()
             if t:
                 self.parts.append(t)
+                self.chars += len(t) + 1
+
+
+def _decoder(resp: httpx.Response) -> codecs.IncrementalDecoder:
+    try:
+        return codecs.getincrementaldecoder(resp.charset_encoding or "utf-8")("replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")("replace")
+
+
+@server.register(
+    "fetch_content",
+    description=(
+        "Fetch and extract the main text of a URL. Long pages are read in pieces: "
+        "pass `offset` (or `chunk`) to continue where the previous call stopped "
+        "(see `next_offset`); follow-up reads are served from cache."
+    ),
+)
+async def fetch_content(
+    url: str, offset: int = 0, max_chars: int = _MAX_CHARS, chunk: int = -1
+) -> dict:
+    max_chars = max(1, min(max_chars, _MAX_CHARS_LIMIT))
+    if chunk >= 0:
+        offset = chunk * max_chars
+    offset = max(0, offset)
+    end = offset + max_chars
+
+    key = urldefrag(url).url
+    doc = _documents.get(key)
+    if doc is None or (not doc["complete"] and len(doc["text"]) < end):
+        # Read ahead so the next few pages are cached too
+        doc = await _fetch(url, budget=max(2 * end, 4 * _MAX_CHARS))
+        _documents.set(key, doc)
+
+    text = doc["text"]
+    more = end < len(text) or not doc["complete"]
+    return {
+        "result": {
+            "url": url,
+            "content": text[offset:end],
+            "offset": offset,
+            "next_offset": end if more else None,
+            "total_chars": len(text) if doc["complete"] else None,
+        }
+    }
 
 
-@server.register("fetch_content", description="Fetch and extract text content from a URL")
-async def fetch_content(url: str) -> dict:
+async def _fetch(url: str, budget: int) -> dict:
     async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
-        resp = await client.get(url, headers={"User-Agent": "ToolUseAPI/0.1"})
-        text = resp.text
-
-    if "<html" in text[:500].lower():
-        extractor = _TextExtractor()
-        extractor.feed(text)
-        text = "\n".join(extractor.parts)
-
-    return {"result": {"url": url, "content": text[:2000]}}
+        async with client.stream("GET", url, headers={"User-Agent": "ToolUseAPI/0.1"}) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type and content_type not in _TEXT_TYPES:
+                raise ValueError(f"Unsupported content type: {content_type}")
+            text, more = await _read_text(resp, "html" in content_type, budget)
+    return {"text": text, "complete": not more}
+
+
+async def _read_text(resp: httpx.Response, is_html: bool, budget: int) -> tuple[str, bool]:
+    """Decode and extract the body incrementally, stopping once `budget` chars
+    of text or _MAX_BYTES of body have been read. Returns (text, more), where
+    `more` means a larger budget would get more text."""
+    decoder = _decoder(resp)
+    extractor: _TextExtractor | None = None
+    raw: list[str] = []
+    chars = received = 0
+    stopped = more = False
+    async for chunk in resp.aiter_bytes():
+        received += len(chunk)
+        data = decoder.decode(chunk)
+        if received == len(chunk):
+            # Servers often send HTML as text/plain or without a type
+            is_html = is_html or "<html" in data[:500].lower()
+            extractor = _TextExtractor() if is_html else None
+        if extractor is not None:
+            extractor.feed(data)
+            chars = extractor.chars
+        else:
+            raw.append(data)
+            chars += len(data)
+        if chars >= budget or received >= _MAX_BYTES:
+            stopped, more = True, chars >= budget and received < _MAX_BYTES
+            break
+
+    if extractor is None:
+        return "".join(raw) + decoder.decode(b"", True), more
+    if not stopped:
+        extractor.feed(decoder.decode(b"", True))
+        extractor.close()
+    return "\n".join(extractor.parts), more
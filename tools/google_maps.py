@@ -1,7 +1,12 @@
+import asyncio
 import os
+import statistics
 
 import httpx
 
+from app.cache import SqliteCache, TTLCache
+from app.config import settings
+from app.metrics import metrics
 from app.sdk import ToolServer
 
 server = ToolServer("google-maps", "Google Maps API tools for geocoding, places, directions, and elevation")
@@ -9,22 +14,64 @@ server = ToolServer("google-maps", "Google Maps API tools for geocoding, places,
 _API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 _BASE = "https://maps.googleapis.com/maps/api"
 
+# Per-request limits of the Elevation and Distance Matrix APIs (elevation is
+# kept well under 512 points so the URL stays short)
+_ELEVATION_CHUNK = 256
+_MAX_SAMPLES = 512
+_MATRIX_SIDE = 25
+_MATRIX_ELEMENTS = 100
+_MAX_CONCURRENT = 4
 
-def _key():
+# Elevation doesn't change: cache points for long. Travel times do.
+_elevations = SqliteCache(settings.cache_dir / "tools.db", namespace="google-elevation", ttl=30 * 86400)
+_matrix = TTLCache(max_entries=4096, ttl=3600)
+metrics.register_cache("google-maps:elevation", _elevations)
+metrics.register_cache("google-maps:matrix", _matrix)
+
+_client: httpx.AsyncClient | None = None
+
+
+def _http() -> httpx.AsyncClient:
+    """Shared client, so calls reuse pooled connections to the API."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=_BASE,
+            timeout=15,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+@server.on_close
+async def _close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _elevations.close()
+
+
+async def _get(path: str, params: dict) -> dict:
+    """API response; a missing key or failed request comes back as a non-OK
+    `status`, like the API's own errors (so tools report it instead of raising)."""
     key = _API_KEY or os.getenv("GOOGLE_MAPS_API_KEY", "")
     if not key:
-        raise ValueError("GOOGLE_MAPS_API_KEY not set")
-    return key
+        return {"status": "GOOGLE_MAPS_API_KEY not set"}
+    resp = await _http().get(path, params={**params, "key": key})
+    if resp.status_code != 200:
+        return {"status": f"HTTP_{resp.status_code}"}
+    try:
+        return resp.json()
+    except ValueError:
+        return {"status": "INVALID_RESPONSE"}
 
 
 @server.register("maps_geocode", description="Convert an address to latitude/longitude coordinates")
 async def maps_geocode(address: str) -> dict:
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(f"{_BASE}/geocode/json", params={
-            "address": address,
-            "key": _key(),
-        })
-        data = resp.json()
+    data = await _get("/geocode/json", {
+        "address": address,
+    })
     if data.get("status") != "OK" or not data.get("results"):
         return {"result": {"error": data.get("status", "NO_RESULTS")}}
     r = data["results"][0]
@@ -38,14 +85,11 @@ async def maps_geocode(address: str) -> dict:
 
 @server.register("maps_search_places", description="Search for nearby places by query and location")
 async def maps_search_places(query: str, location: str, radius: int = 1000) -> dict:
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(f"{_BASE}/place/textsearch/json", params={
-            "query": query,
-            "location": location,
-            "radius": radius,
-            "key": _key(),
-        })
-        data = resp.json()
+    data = await _get("/place/textsearch/json", {
+        "query": query,
+        "location": location,
+        "radius": radius,
+    })
     if data.get("status") != "OK":
         return {"result": {"error": data.get("status", "NO_RESULTS"), "results": []}}
     results = []
@@ -61,14 +105,11 @@ async def maps_search_places(query: str, location: str, radius: int = 1000) -> d
 
 @server.register("maps_directions", description="Get directions between two locations")
 async def maps_directions(origin: str, destination: str, mode: str = "walking") -> dict:
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(f"{_BASE}/directions/json", params={
-            "origin": origin,
-            "destination": destination,
-            "mode": mode,
-            "key": _key(),
-        })
-        data = resp.json()
+    data = await _get("/directions/json", {
+        "origin": origin,
+        "destination": destination,
+        "mode": mode,
+    })
     if data.get("status") != "OK" or not data.get("routes"):
         return {"result": {"error": data.get("status", "NO_ROUTES")}}
     leg = data["routes"][0]["legs"][0]
@@ -82,16 +123,243 @@ async def maps_directions(origin: str, destination: str, mode: str = "walking")
 
 @server.register("maps_elevation", description="Get elevation at a latitude/longitude point")
 async def maps_elevation(latitude: float, longitude: float) -> dict:
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(f"{_BASE}/elevation/json", params={
-            "locations": f"{latitude},{longitude}",
-            "key": _key(),
-        })
-        data = resp.json()
-    if data.get("status") != "OK" or not data.get("results"):
-        return {"result": {"error": data.get("status", "NO_RESULTS")}}
-    r = data["results"][0]
+    try:
+        points = await _elevations_at([_parse_point((latitude, longitude))])
+    except ValueError:
+        return {"result": {"error": "latitude and longitude must be numbers"}}
+    except _ApiError as e:
+        return {"result": {"error": str(e)}}
+    if not points:
+        return {"result": {"error": "NO_RESULTS"}}
+    point = points[0]
     return {"result": {
+        "elevation": point["elevation"],
+        "resolution": point["resolution"],
+    }}
+
+
+# -- batched elevation ------------------------------------------------------
+
+class _ApiError(Exception):
+    """A non-OK `status` from the API."""
+
+
+async def _get_ok(path: str, params: dict) -> dict:
+    data = await _get(path, params)
+    if data.get("status") != "OK":
+        raise _ApiError(data.get("status", "UNKNOWN_ERROR"))
+    return data
+
+
+async def _bounded(coros: list) -> list:
+    """Run requests concurrently, at most _MAX_CONCURRENT at a time."""
+    slots = asyncio.Semaphore(_MAX_CONCURRENT)
+
+    async def run(coro):
+        async with slots:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+def _parse_point(point) -> str:
+    """'lat,lng', [lat, lng] or {"latitude": .., "longitude": ..} -> 'lat,lng'."""
+    if isinstance(point, str):
+        lat, lng = (float(x) for x in point.split(","))
+    elif isinstance(point, dict):
+        lat, lng = float(point["latitude"]), float(point["longitude"])
+    else:
+        lat, lng = (float(x) for x in point)
+    return f"{lat:.6f},{lng:.6f}"
+
+
+def _elevation_point(r: dict) -> dict:
+    loc = r["location"]
+    return {
+        "latitude": loc["lat"],
+        "longitude": loc["lng"],
         "elevation": round(r["elevation"], 2),
         "resolution": round(r.get("resolution", 0), 2),
+    }
+
+
+async def _elevations_at(points: list[str]) -> list[dict]:
+    """Elevation per point, from cache or in chunked requests for the rest."""
+    found = {p: v for p in dict.fromkeys(points) if (v := _elevations.get(p)) is not None}
+    missing = [p for p in dict.fromkeys(points) if p not in found]
+    chunks = [missing[i:i + _ELEVATION_CHUNK] for i in range(0, len(missing), _ELEVATION_CHUNK)]
+    responses = await _bounded([
+        _get_ok("/elevation/json", {"locations": "|".join(chunk)}) for chunk in chunks
+    ])
+    for chunk, data in zip(chunks, responses):
+        for point, r in zip(chunk, data["results"]):
+            found[point] = _elevation_point(r)
+            _elevations.set(point, found[point])
+    return [found[p] for p in points if p in found]
+
+
+def _summary(points: list[dict]) -> dict:
+    heights = [p["elevation"] for p in points]
+    return {
+        "min_m": min(heights),
+        "max_m": max(heights),
+        "mean_m": round(statistics.fmean(heights), 2),
+        "range_m": round(max(heights) - min(heights), 2),
+    }
+
+
+@server.register(
+    "maps_elevation_batch",
+    description=(
+        "Get elevations for many points in one call: a list of `locations`, or a `path` "
+        "sampled at `samples` evenly spaced points (e.g. to judge how hilly an area or route is)"
+    ),
+    parameters={
+        "locations": {
+            "type": "array",
+            "items": {"type": "string"},
+            "required": False,
+            "description": "Points as 'lat,lng' strings",
+        },
+        "path": {
+            "type": "array",
+            "items": {"type": "string"},
+            "required": False,
+            "description": "Path vertices as 'lat,lng' strings",
+        },
+        "samples": {
+            "type": "integer",
+            "required": False,
+            "description": f"Points to sample along `path` (2-{_MAX_SAMPLES}, default 20)",
+        },
+    },
+)
+async def maps_elevation_batch(
+    locations: list | None = None, path: list | None = None, samples: int = 20
+) -> dict:
+    try:
+        vertices = [_parse_point(p) for p in path or []]
+        wanted = [_parse_point(p) for p in locations or []]
+    except (KeyError, TypeError, ValueError):
+        return {"result": {"error": "Points must be 'lat,lng' strings"}}
+    try:
+        if vertices:
+            if len(vertices) < 2:
+                return {"result": {"error": "A path needs at least two points"}}
+            samples = max(2, min(samples, _MAX_SAMPLES))
+            key = f"path:{samples}:{'|'.join(vertices)}"
+            points = _elevations.get(key)
+            if points is None:
+                data = await _get_ok("/elevation/json", {"path": "|".join(vertices), "samples": samples})
+                points = [_elevation_point(r) for r in data["results"]]
+                _elevations.set(key, points)
+        elif wanted:
+            points = await _elevations_at(wanted)
+        else:
+            return {"result": {"error": "Give `locations` or a `path`"}}
+    except _ApiError as e:
+        return {"result": {"error": str(e)}}
+    if not points:
+        return {"result": {"error": "NO_RESULTS"}}
+
+    summary = _summary(points)
+    if vertices:
+        diffs = [b["elevation"] - a["elevation"] for a, b in zip(points, points[1:])]
+        summary["ascent_m"] = round(sum(d for d in diffs if d > 0), 2)
+        summary["descent_m"] = round(-sum(d for d in diffs if d < 0), 2)
+    return {"result": {"points": points, "summary": summary}}
+
+
+# -- distance matrix --------------------------------------------------------
+
+def _matrix_chunks(origins: list[str], destinations: list[str]) -> list[tuple[list[str], list[str]]]:
+    """Split into requests within the per-request origin/destination/element limits."""
+    chunks = []
+    for d in range(0, len(destinations), _MATRIX_SIDE):
+        dest = destinations[d:d + _MATRIX_SIDE]
+        rows = max(1, min(_MATRIX_SIDE, _MATRIX_ELEMENTS // len(dest)))
+        for o in range(0, len(origins), rows):
+            chunks.append((origins[o:o + rows], dest))
+    return chunks
+
+
+def _matrix_element(destination: str, el: dict) -> dict:
+    if el.get("status") != "OK":
+        return {"destination": destination, "status": el.get("status", "UNKNOWN_ERROR")}
+    return {
+        "destination": destination,
+        "status": "OK",
+        "distance": el["distance"]["text"],
+        "distance_m": el["distance"]["value"],
+        "duration": el["duration"]["text"],
+        "duration_s": el["duration"]["value"],
+    }
+
+
+@server.register(
+    "maps_distance_matrix",
+    description=(
+        "Travel distance and time from every origin to every destination in one call "
+        "(up to 25 x 25), e.g. to compare routes or find the closest option"
+    ),
+    parameters={
+        "origins": {
+            "type": "array",
+            "items": {"type": "string"},
+            "required": True,
+            "description": "Addresses or 'lat,lng' strings",
+        },
+        "destinations": {
+            "type": "array",
+            "items": {"type": "string"},
+            "required": True,
+            "description": "Addresses or 'lat,lng' strings",
+        },
+        "mode": {
+            "type": "string",
+            "required": False,
+            "description": "driving (default), walking, bicycling or transit",
+        },
+    },
+)
+async def maps_distance_matrix(origins: list, destinations: list, mode: str = "driving") -> dict:
+    origins = [str(o).strip() for o in origins]
+    destinations = [str(d).strip() for d in destinations]
+    if not origins or not destinations:
+        return {"result": {"error": "Give at least one origin and one destination"}}
+    if len(origins) > _MATRIX_SIDE or len(destinations) > _MATRIX_SIDE:
+        return {"result": {"error": f"At most {_MATRIX_SIDE} origins and {_MATRIX_SIDE} destinations"}}
+
+    def key(o: str, d: str) -> str:
+        return f"{mode}|{o}|{d}"
+
+    cells = {key(o, d): v for o in origins for d in destinations if (v := _matrix.get(key(o, d)))}
+    # Re-request whole rows that have any cell missing
+    missing_rows = [o for o in dict.fromkeys(origins) if any(key(o, d) not in cells for d in destinations)]
+    if missing_rows:
+        chunks = _matrix_chunks(missing_rows, list(dict.fromkeys(destinations)))
+        try:
+            responses = await _bounded([
+                _get_ok("/distancematrix/json", {
+                    "origins": "|".join(orig),
+                    "destinations": "|".join(dest),
+                    "mode": mode,
+                })
+                for orig, dest in chunks
+            ])
+        except _ApiError as e:
+            return {"result": {"error": str(e)}}
+        for (orig, dest), data in zip(chunks, responses):
+            for o, row in zip(orig, data["rows"]):
+                for d, el in zip(dest, row["elements"]):
+                    cells[key(o, d)] = element = _matrix_element(d, el)
+                    if element["status"] == "OK":
+                        _matrix.set(key(o, d), element)
+
+    return {"result": {
+        "mode": mode,
+        "rows": [
+            {"origin": o, "elements": [cells[key(o, d)] for d in destinations]}
+            for o in origins
+        ],
     }}
@@ -1,35 +1,124 @@
+"""Translation via the MyMemory API (free tier is quota-limited).
+
+Translations are kept in a persistent translation memory keyed by language
+pair and normalized text, so repeated phrases cost no quota. A list of
+texts is deduplicated and its misses are sent concurrently (a few at a
+time), since MyMemory translates one text per request.
+"""
+
+import asyncio
+import logging
 import os
+import unicodedata
 
 import httpx
 
+from app.batching import Coalescer
+from app.cache import SqliteCache, TTLCache
+from app.config import settings
+from app.metrics import metrics
 from app.sdk import ToolServer
 
+logger = logging.getLogger(__name__)
+
 server = ToolServer("lara-translate", "Translation tool using MyMemory API (free, no key required)")
 
 _API_KEY = os.getenv("MYMEMORY_API_KEY", "")
 _BASE = "https://api.mymemory.translated.net"
+_CONCURRENCY = 4
+_MAX_TEXTS = 100
+
+_memory = SqliteCache(settings.cache_dir / "tools.db", namespace="translation-memory", max_entries=100_000)
+metrics.register_cache("lara-translate:memory", _memory)
+
+
+# Cache key -> text as given, which is what gets translated (keys only
+# tidy spacing within lines). Kept briefly: only until the batch is sent.
+_originals = TTLCache(max_entries=4096, ttl=300)
+
 
+def _normalize(text: str) -> str:
+    """Key form: NFC, spacing collapsed within each line, line breaks kept."""
+    lines = unicodedata.normalize("NFC", text).strip().splitlines()
+    return "\n".join(" ".join(line.split()) for line in lines)
 
-@server.register("translate", description="Translate text from one language to another")
-async def translate(text: str, source: str = "en", target: str = "it") -> dict:
-    params = {
-        "q": text,
-        "langpair": f"{source}|{target}",
-    }
-    if _API_KEY:
-        params["key"] = _API_KEY
+
+async def _translate_many(keys: list[str]) -> dict[str, str]:
+    """Translate 'source|target|text' keys; failed ones are left out (and not cached)."""
+    slots = asyncio.Semaphore(_CONCURRENCY)
+
+    async def one(client: httpx.AsyncClient, key: str) -> tuple[str, str]:
+        source, target, normalized = key.split("|", 2)
+        params = {"q": _originals.get(key) or normalized, "langpair": f"{source}|{target}"}
+        if _API_KEY:
+            params["key"] = _API_KEY
+        async with slots:
+            try:
+                resp = await client.get(f"{_BASE}/get", params=params)
+                data = resp.json()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("MyMemory request failed: %s", e)
+                return key, ""
+        # Quota and other errors come back as text with a non-200 responseStatus
+        if str(data.get("responseStatus")) != "200":
+            logger.warning("MyMemory error %s: %s", data.get("responseStatus"), data.get("responseDetails"))
+            return key, ""
+        return key, (data.get("responseData") or {}).get("translatedText", "")
 
     async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(f"{_BASE}/get", params=params)
-        data = resp.json()
+        results = await asyncio.gather(*(one(client, key) for key in keys))
+    return {key: translation for key, translation in results if translation}
+
+
+# Also merges identical phrases requested by concurrent tool calls
+_lookups = Coalescer(_translate_many, window=0.01, max_batch=_MAX_TEXTS, cache=_memory)
+server.on_close(_memory.close)
+
+
+@server.register(
+    "translate",
+    description="Translate text from one language to another; pass `texts` to translate several phrases in one call",
+    parameters={
+        "text": {"type": "string", "required": False, "description": "Text to translate"},
+        "texts": {
+            "type": "array",
+            "items": {"type": "string"},
+            "required": False,
+            "description": f"Several texts to translate (up to {_MAX_TEXTS})",
+        },
+        "source": {"type": "string", "required": False, "description": "Source language code (default en)"},
+        "target": {"type": "string", "required": False, "description": "Target language code (default it)"},
+    },
+)
+async def translate(
+    text: str = "", texts: list | None = None, source: str = "en", target: str = "it"
+) -> dict:
+    phrases = ([text] if text else []) + list(texts or [])
+    if not phrases:
+        return {"result": {"error": "Give `text` or `texts`"}}
+    if len(phrases) > _MAX_TEXTS:
+        return {"result": {"error": f"Too many texts ({len(phrases)}, max {_MAX_TEXTS})"}}
 
-    match = data.get("responseData", {})
-    translation = match.get("translatedText", "")
-    if not translation:
-        return {"result": {"error": "Translation failed"}}
+    pair = f"{source.strip().lower()}|{target.strip().lower()}"
+    keys = [f"{pair}|{_normalize(p)}" for p in phrases]
+    for key, phrase in zip(keys, phrases):
+        _originals.set(key, phrase)
+    found = await _lookups.get_many(keys)
 
+    if text and not texts:
+        translation = found.get(keys[0])
+        if not translation:
+            return {"result": {"error": "Translation failed"}}
+        return {"result": {
+            "translation": translation,
+            "source": source,
+            "target": target,
+        }}
     return {"result": {
-        "translation": translation,
+        "translations": [
+            {"text": p, "translation": found.get(k)} if k in found else {"text": p, "error": "Translation failed"}
+            for p, k in zip(phrases, keys)
+        ],
         "source": source,
         "target": target,
     }}
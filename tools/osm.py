@@ -1,9 +1,32 @@
-"""OpenStreetMap — geocoding, nearby search, routing. No API key needed."""
+"""OpenStreetMap — geocoding, nearby search, routing. No API key needed.
+
+Overpass results are cached on disk in geohash tiles per tag: a nearby
+search fetches the tiles its circle touches (only the missing ones, in one
+query) and filters their nodes locally, so overlapping searches from
+different trajectories reuse the same tiles. Loaded tiles are
+indexed in per-tile KD-trees, so results come back ranked by true distance.
+Geocodes are cached under normalized addresses and rounded coordinates.
+"""
+
+import heapq
+import math
+import re
+from typing import Any
 
 import httpx
 
+from app.batching import Coalescer
+from app.cache import SqliteCache, TTLCache
+from app.config import settings
+from app.metrics import metrics
+from app.ratelimit import RateLimiter
 from app.sdk import ToolServer
 
+try:
+    import numpy as np
+except ImportError:  # ranking falls back to pure Python
+    np = None
+
 server = ToolServer("osm-mcp-server", "OpenStreetMap — geocoding, places, directions")
 
 _NOMINATIM = "https://nominatim.openstreetmap.org"
@@ -11,50 +34,504 @@ _OSRM = "https://router.project-osrm.org"
 _OVERPASS = "https://overpass-api.de/api/interpreter"
 _HEADERS = {"User-Agent": "ToolUseAPI/0.1"}
 
+# Nominatim's usage policy allows one request per second
+_nominatim_limit = RateLimiter("nominatim", rate=1)
+
+_geocodes = SqliteCache(settings.cache_dir / "tools.db", namespace="osm-geocode", ttl=30 * 86400)
+metrics.register_cache("osm:geocode", _geocodes)
+
+
+def _numbers(*values: Any) -> tuple[float, ...] | None:
+    """Coordinate arguments as finite floats (clients may send "52.5"), else None."""
+    try:
+        numbers = tuple(float(v) for v in values)
+    except (TypeError, ValueError):
+        return None
+    return numbers if all(math.isfinite(n) for n in numbers) else None
+
+
+def _normalize_address(address: str) -> str:
+    return re.sub(r"[\s,;]+", " ", address.lower()).strip()
+
 
 @server.register(
     "geocode_address", description="Convert an address to latitude/longitude"
 )
 async def geocode_address(address: str) -> dict:
-    async with httpx.AsyncClient(headers=_HEADERS, timeout=15) as client:
+    key = f"search:{_normalize_address(address)}"
+    cached = _geocodes.get(key)
+    if cached is not None:
+        return {"result": cached}
+
+    async with _nominatim_limit, httpx.AsyncClient(headers=_HEADERS, timeout=15) as client:
         resp = await client.get(
             f"{_NOMINATIM}/search",
             params={"q": address, "format": "json", "limit": 1},
         )
         results = resp.json()
-        if not results:
-            return {"error": "Address not found"}
-        r = results[0]
-        return {
-            "result": {
-                "lat": float(r["lat"]),
-                "lon": float(r["lon"]),
-                "display_name": r["display_name"],
-            }
-        }
+    if not results:
+        return {"error": "Address not found"}
+    r = results[0]
+    result = {
+        "lat": float(r["lat"]),
+        "lon": float(r["lon"]),
+        "display_name": r["display_name"],
+    }
+    _geocodes.set(key, result)
+    return {"result": result}
 
 
 @server.register(
     "reverse_geocode", description="Convert latitude/longitude to an address"
 )
 async def reverse_geocode(latitude: float, longitude: float) -> dict:
-    async with httpx.AsyncClient(headers=_HEADERS, timeout=15) as client:
+    coords = _numbers(latitude, longitude)
+    if coords is None:
+        return {"result": {"error": "latitude and longitude must be numbers"}}
+    latitude, longitude = coords
+    # 5 decimals is about a metre
+    key = f"reverse:{latitude:.5f},{longitude:.5f}"
+    cached = _geocodes.get(key)
+    if cached is not None:
+        return {"result": cached}
+
+    async with _nominatim_limit, httpx.AsyncClient(headers=_HEADERS, timeout=15) as client:
         resp = await client.get(
             f"{_NOMINATIM}/reverse",
             params={"lat": latitude, "lon": longitude, "format": "json"},
         )
         r = resp.json()
-        return {
-            "result": {
-                "display_name": r.get("display_name", ""),
-                "address": r.get("address", {}),
-            }
-        }
+    result = {
+        "display_name": r.get("display_name", ""),
+        "address": r.get("address", {}),
+    }
+    if result["display_name"]:
+        _geocodes.set(key, result)
+    return {"result": result}
+
+
+# -- geohash tiles ----------------------------------------------------------
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_TILE_PRECISION = 6  # about 1.2 x 0.6 km
+_MAX_TILES = 100  # larger searches go straight to Overpass, uncached
+_MAX_AROUND = 2000  # nodes ranked from one of those direct searches
+_EARTH_RADIUS_M = 6_371_000
+
+
+def _geohash(lat: float, lon: float, precision: int = _TILE_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            value = value * 2 + (lon >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if lon >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = value * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def _tile_size(precision: int = _TILE_PRECISION) -> tuple[float, float]:
+    """(lat, lon) size of a tile in degrees."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def _tile_bbox(tile: str) -> tuple[float, float, float, float]:
+    """(south, west, north, east) of a geohash tile."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in tile:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def _tiles_around(lat: float, lon: float, radius: float) -> list[str] | None:
+    """Tiles covering the circle's bounding box, nearest first; None if there
+    are too many."""
+    dlat, dlon = _tile_size()
+    rlat = math.degrees(radius / _EARTH_RADIUS_M)
+    rlon = rlat / max(math.cos(math.radians(lat)), 0.01)
+    rows = range(math.floor((lat - rlat + 90) / dlat), math.floor((lat + rlat + 90) / dlat) + 1)
+    cols = range(math.floor((lon - rlon + 180) / dlon), math.floor((lon + rlon + 180) / dlon) + 1)
+    if len(rows) * len(cols) > _MAX_TILES:
+        return None
+    tiles = []
+    for row in rows:
+        center_lat = min(-90 + (row + 0.5) * dlat, 90.0)
+        for col in cols:
+            center_lon = (-180 + (col + 0.5) * dlon + 180) % 360 - 180
+            tiles.append((_haversine_m(lat, lon, center_lat, center_lon), _geohash(center_lat, center_lon)))
+    tiles.sort()
+    return list(dict.fromkeys(tile for _, tile in tiles))
+
+
+def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((p2 - p1) / 2) ** 2
+        + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+# -- tile cache -------------------------------------------------------------
+
+# Tiles are cached per layer: one tag selector, or the union used by explore_area
+_EXPLORE = ('"amenity"', '"tourism"', '"shop"')
+_KEEP_TAGS = (
+    "name", "amenity", "tourism", "shop", "leisure", "cuisine", "opening_hours",
+    "addr:street", "addr:housenumber", "addr:city", "phone", "website",
+)
+
+# Empty tiles expire sooner: an area with nothing to find is rare enough that
+# an empty result may be an Overpass hiccup
+_TILE_TTL = 7 * 86400
+_EMPTY_TILE_TTL = 3600
+
+_tile_cache = SqliteCache(
+    settings.cache_dir / "tools.db", namespace="osm-tiles", max_entries=50_000, ttl=_TILE_TTL
+)
+metrics.register_cache("osm:tiles", _tile_cache)
+
+
+def _overpass_query(selectors: tuple[str, ...], areas: list[str], limit: str = "") -> str:
+    parts = "".join(f"node[{sel}]({area});" for sel in selectors for area in areas)
+    return f"[out:json][timeout:25];({parts});out body {limit};"
+
+
+class _OverpassError(Exception):
+    """Overpass answered 200 but flagged the result (timeout, out of memory)."""
+
+
+async def _overpass(query: str) -> list[dict]:
+    async with httpx.AsyncClient(headers=_HEADERS, timeout=30) as client:
+        resp = await client.post(_OVERPASS, data={"data": query})
+        resp.raise_for_status()
+        data = resp.json()
+    # A remark means the result may be partial or empty: never cache it
+    if data.get("remark"):
+        raise _OverpassError(f"Overpass: {data['remark']}")
+    return data.get("elements", [])
+
+
+def _compact(el: dict) -> dict:
+    tags = el.get("tags", {})
+    return {
+        "id": el.get("id"),
+        "lat": el.get("lat"),
+        "lon": el.get("lon"),
+        "tags": {k: tags[k] for k in _KEEP_TAGS if k in tags},
+    }
+
+
+async def _fetch_tiles(keys: list[str]) -> dict[str, list[dict]]:
+    """Fetch missing tiles: one Overpass query per layer. Keys are 'layer|tile'."""
+    by_layer: dict[str, list[str]] = {}
+    for key in keys:
+        layer, tile = key.rsplit("|", 1)
+        by_layer.setdefault(layer, []).append(tile)
+
+    found: dict[str, list[dict]] = {}
+    for layer, tiles in by_layer.items():
+        selectors = _EXPLORE if layer == "explore" else (layer,)
+        areas = [",".join(f"{x:.7f}" for x in _tile_bbox(t)) for t in tiles]
+        nodes = await _overpass(_overpass_query(selectors, areas))
+        # Empty tiles are cached too, briefly (see _EMPTY_TILE_TTL)
+        found.update({f"{layer}|{t}": [] for t in tiles})
+        seen: set[Any] = set()
+        for el in nodes:
+            if el.get("lat") is None or el["id"] in seen:
+                continue
+            seen.add(el["id"])
+            key = f"{layer}|{_geohash(el['lat'], el['lon'])}"
+            if key in found:
+                found[key].append(_compact(el))
+    return found
+
+
+_tiles = Coalescer(
+    _fetch_tiles,
+    window=0.05,
+    max_batch=_MAX_TILES,
+    cache=_tile_cache,
+    ttl=lambda key, nodes: _TILE_TTL if nodes else _EMPTY_TILE_TTL,
+)
+
+
+@server.on_close
+def _close() -> None:
+    _geocodes.close()
+    _tile_cache.close()
+    _nominatim_limit.close()
+
+
+# -- spatial index ----------------------------------------------------------
+
+def _unit_vectors(lats, lons):
+    """Points on the unit sphere: straight-line (chord) distance between them
+    orders pairs the same way as great-circle distance."""
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _chord(metres: float) -> float:
+    return 2 * math.sin(min(metres / _EARTH_RADIUS_M, math.pi) / 2)
+
+
+def _haversine_np(lat: float, lon: float, lats, lons):
+    p1, p2 = math.radians(lat), np.radians(lats)
+    a = (
+        np.sin((p2 - p1) / 2) ** 2
+        + math.cos(p1) * np.cos(p2) * np.sin(np.radians(lons - lon) / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _KDTree:
+    """KD-tree over 3-D points with bounding boxes per node. Leaves hold up to
+    _LEAF points and are scanned with NumPy, so Python only walks the
+    O(log n) inner nodes."""
+
+    _LEAF = 32
+
+    def __init__(self, points) -> None:
+        self.points = points
+        self.order = np.arange(len(points))
+        # Per node: bounding box, [start, end) range of self.order, children (-1 for leaves)
+        self.lo: list = []
+        self.hi: list = []
+        self.span: list[tuple[int, int]] = []
+        self.children: list[tuple[int, int]] = []
+        if len(points):
+            self._build(0, len(points))
+
+    def _build(self, start: int, end: int) -> int:
+        idx = self.order[start:end]
+        pts = self.points[idx]
+        node = len(self.span)
+        self.lo.append(pts.min(axis=0))
+        self.hi.append(pts.max(axis=0))
+        self.span.append((start, end))
+        self.children.append((-1, -1))
+        if end - start > self._LEAF:
+            axis = int(np.argmax(self.hi[node] - self.lo[node]))
+            mid = (end - start) // 2
+            self.order[start:end] = idx[np.argpartition(pts[:, axis], mid)]
+            left = self._build(start, start + mid)
+            right = self._build(start + mid, end)
+            self.children[node] = (left, right)
+        return node
+
+    def _box_distance(self, node: int, q) -> float:
+        gap = np.maximum(np.maximum(self.lo[node] - q, q - self.hi[node]), 0.0)
+        return float(np.sqrt(gap @ gap))
+
+    def _leaf(self, node: int, q):
+        start, end = self.span[node]
+        idx = self.order[start:end]
+        diff = self.points[idx] - q
+        return idx, np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    def within(self, q, r: float):
+        """Indexes of points within chord distance r of q."""
+        found = []
+        stack = [0] if self.span else []
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, q) > r:
+                continue
+            left, right = self.children[node]
+            if left < 0:
+                idx, dist = self._leaf(node, q)
+                found.append(idx[dist <= r])
+            else:
+                stack.extend((left, right))
+        return np.concatenate(found) if found else np.empty(0, dtype=int)
+
+    def nearest(self, q, k: int, r: float):
+        """Up to k indexes of the points nearest q within chord distance r, nearest first."""
+        best_idx = np.empty(0, dtype=int)
+        best_dist = np.empty(0)
+        heap = [(0.0, 0)] if self.span and k > 0 else []
+        while heap:
+            bound, node = heapq.heappop(heap)
+            limit = best_dist[-1] if len(best_dist) == k else r
+            if bound > limit:
+                break
+            left, right = self.children[node]
+            if left < 0:
+                idx, dist = self._leaf(node, q)
+                keep = dist <= r
+                best_idx = np.concatenate((best_idx, idx[keep]))
+                best_dist = np.concatenate((best_dist, dist[keep]))
+                top = np.argsort(best_dist, kind="stable")[:k]
+                best_idx, best_dist = best_idx[top], best_dist[top]
+            else:
+                for child in (left, right):
+                    heapq.heappush(heap, (self._box_distance(child, q), child))
+        return best_idx
+
+
+class _TileIndex:
+    """The nodes of one tile, indexed once for radius and k-nearest queries."""
+
+    def __init__(self, nodes: list[dict]) -> None:
+        self.nodes = nodes
+        if np is not None:
+            self.lats = np.array([n["lat"] for n in nodes], dtype=float)
+            self.lons = np.array([n["lon"] for n in nodes], dtype=float)
+            self.tree = _KDTree(_unit_vectors(self.lats, self.lons))
+
+    def within(self, lat: float, lon: float, radius: float) -> int:
+        """Number of nodes within `radius` metres."""
+        if np is None:
+            return sum(1 for n in self.nodes if _haversine_m(lat, lon, n["lat"], n["lon"]) <= radius)
+        idx = self.tree.within(_unit_vectors(lat, lon)[0], _chord(radius))
+        return int(np.count_nonzero(_haversine_np(lat, lon, self.lats[idx], self.lons[idx]) <= radius))
+
+    def nearest(self, lat: float, lon: float, k: int, radius: float) -> list[tuple[float, dict]]:
+        """Up to k (distance in metres, node) within `radius`, nearest first."""
+        if np is None:
+            ranked = sorted(
+                ((d, i) for i, n in enumerate(self.nodes)
+                 if (d := _haversine_m(lat, lon, n["lat"], n["lon"])) <= radius),
+                key=lambda pair: pair[0],
+            )
+            return [(d, self.nodes[i]) for d, i in ranked[:k]]
+        # A little slack so float error at the edge can't drop a node
+        idx = self.tree.nearest(_unit_vectors(lat, lon)[0], k, _chord(radius) * (1 + 1e-9))
+        dist = _haversine_np(lat, lon, self.lats[idx], self.lons[idx])
+        return [(float(d), self.nodes[i]) for i, d in zip(idx, dist) if d <= radius]
+
+
+class _PlaceIndex:
+    """The tiles of one layer around a query, searched tile by tile. Tile
+    indexes are built once, when a tile is first loaded, so a query that
+    brings in new tiles never re-indexes the ones it already had."""
+
+    def __init__(self, tiles: list[_TileIndex]) -> None:
+        self.tiles = tiles
+
+    def within(self, lat: float, lon: float, radius: float) -> int:
+        """Number of nodes within `radius` metres."""
+        return sum(t.within(lat, lon, radius) for t in self.tiles)
+
+    def nearest(self, lat: float, lon: float, k: int, radius: float) -> list[tuple[dict, float]]:
+        """Up to k (node, distance in metres) within `radius`, nearest first."""
+        if k <= 0:
+            return []
+        best: list[tuple[float, int, dict]] = []  # max-heap on distance, via negation
+        seq = 0  # tie-break in load order, so nodes themselves are never compared
+        for tile in self.tiles:
+            # Once k are found, later tiles only need to beat the k-th
+            bound = -best[0][0] if len(best) == k else radius
+            for d, node in tile.nearest(lat, lon, k, bound):
+                seq += 1
+                item = (-d, -seq, node)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, item)
+        return [(node, -d) for d, _, node in sorted(best, key=lambda item: (-item[0], -item[1]))]
+
+
+# "layer|tile" -> index of that tile's nodes; expires well before the tile
+# itself so a refreshed tile gets re-indexed
+_tile_indexes = TTLCache(max_entries=4096, ttl=3600)
+
+
+def _tile_index(key: str, nodes: list[dict]) -> _TileIndex:
+    index = _TileIndex(nodes)
+    _tile_indexes.set(key, index)
+    return index
+
+
+async def _index_around(layer: str, latitude: float, longitude: float, radius: float) -> _PlaceIndex:
+    """An index holding every node of `layer` within `radius` metres."""
+    tiles = _tiles_around(latitude, longitude, radius)
+    if tiles is None:
+        # Too large to tile: index one uncached query
+        selectors = _EXPLORE if layer == "explore" else (layer,)
+        around = f"around:{radius},{latitude},{longitude}"
+        elements = await _overpass(_overpass_query(selectors, [around], str(_MAX_AROUND)))
+        return _PlaceIndex([_TileIndex([_compact(el) for el in elements if el.get("lat") is not None])])
+
+    # Tiles indexed already skip the disk cache and its deserialization
+    keys = [f"{layer}|{t}" for t in tiles]
+    indexed = {k: index for k in keys if (index := _tile_indexes.get(k)) is not None}
+    loaded = await _tiles.get_many(k for k in keys if k not in indexed)
+    indexed.update((key, _tile_index(key, nodes)) for key, nodes in loaded.items())
+    return _PlaceIndex([indexed[k] for k in keys if k in indexed and indexed[k].nodes])
+
+
+# -- places -----------------------------------------------------------------
+
+_MAX_LIMIT = 50
+
+_TAG_MAP = {
+    "restaurant": '"amenity"="restaurant"',
+    "hotel": '"tourism"="hotel"',
+    "cafe": '"amenity"="cafe"',
+    "bar": '"amenity"="bar"',
+    "hospital": '"amenity"="hospital"',
+    "pharmacy": '"amenity"="pharmacy"',
+    "school": '"amenity"="school"',
+    "parking": '"amenity"="parking"',
+    "fuel": '"amenity"="fuel"',
+    "supermarket": '"shop"="supermarket"',
+    "museum": '"tourism"="museum"',
+    "park": '"leisure"="park"',
+    "bank": '"amenity"="bank"',
+    "atm": '"amenity"="atm"',
+}
 
 
 @server.register(
     "find_nearby_places",
-    description="Find places near coordinates (restaurants, hotels, etc.)",
+    description=(
+        "Find the places nearest to coordinates (restaurants, hotels, etc.), "
+        "closest first, with their distance in metres"
+    ),
+    parameters={
+        "latitude": {"type": "number", "required": True, "description": "Latitude of the search centre"},
+        "longitude": {"type": "number", "required": True, "description": "Longitude of the search centre"},
+        "radius": {
+            "type": "integer",
+            "required": False,
+            "minimum": 1,
+            "description": "Search radius in metres (default 1000)",
+        },
+        "categories": {
+            "type": "string",
+            "required": False,
+            "description": "e.g. restaurant, hotel, cafe, pharmacy (default restaurant)",
+        },
+        "limit": {
+            "type": "integer",
+            "required": False,
+            "minimum": 1,
+            "maximum": _MAX_LIMIT,
+            "description": f"Places to return (1-{_MAX_LIMIT}, default 5)",
+        },
+    },
 )
 async def find_nearby_places(
     latitude: float,
@@ -63,42 +540,25 @@ async def find_nearby_places(
     categories: str = "restaurant",
     limit: int = 5,
 ) -> dict:
+    coords = _numbers(latitude, longitude, radius, limit)
+    if coords is None:
+        return {"result": {"error": "latitude, longitude, radius and limit must be numbers"}}
+    latitude, longitude, radius, limit = coords
+    limit = max(1, min(int(limit), _MAX_LIMIT))
     # Map common categories to OSM tags
-    tag_map = {
-        "restaurant": '"amenity"="restaurant"',
-        "hotel": '"tourism"="hotel"',
-        "cafe": '"amenity"="cafe"',
-        "bar": '"amenity"="bar"',
-        "hospital": '"amenity"="hospital"',
-        "pharmacy": '"amenity"="pharmacy"',
-        "school": '"amenity"="school"',
-        "parking": '"amenity"="parking"',
-        "fuel": '"amenity"="fuel"',
-        "supermarket": '"shop"="supermarket"',
-        "museum": '"tourism"="museum"',
-        "park": '"leisure"="park"',
-        "bank": '"amenity"="bank"',
-        "atm": '"amenity"="atm"',
-    }
-    osm_tag = tag_map.get(categories, f'"amenity"="{categories}"')
-
-    query = (
-        f"[out:json][timeout:15];"
-        f"node[{osm_tag}](around:{radius},{latitude},{longitude});"
-        f"out body {limit};"
-    )
-    async with httpx.AsyncClient(headers=_HEADERS, timeout=30) as client:
-        resp = await client.post(_OVERPASS, data={"data": query})
-        data = resp.json()
+    category = re.sub(r'["\\\]\[]', "", categories.strip().lower())
+    osm_tag = _TAG_MAP.get(category, f'"amenity"="{category}"')
+    index = await _index_around(osm_tag, latitude, longitude, radius)
 
     places = []
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
+    for node, distance in index.nearest(latitude, longitude, limit, radius):
+        tags = node["tags"]
         places.append(
             {
                 "name": tags.get("name", "Unknown"),
-                "lat": el.get("lat"),
-                "lon": el.get("lon"),
+                "lat": node["lat"],
+                "lon": node["lon"],
+                "distance_m": round(distance),
                 "category": categories,
                 "address": ", ".join(
                     filter(
@@ -114,7 +574,7 @@ async def find_nearby_places(
                 "website": tags.get("website", ""),
             }
         )
-    return {"result": places}
+    return {"result": places, "total_in_radius": index.within(latitude, longitude, radius)}
 
 
 @server.register(
@@ -128,6 +588,10 @@ async def get_route_directions(
     to_longitude: float,
     mode: str = "driving",
 ) -> dict:
+    coords = _numbers(from_latitude, from_longitude, to_latitude, to_longitude)
+    if coords is None:
+        return {"result": {"error": "Coordinates must be numbers"}}
+    from_latitude, from_longitude, to_latitude, to_longitude = coords
     profile = {"driving": "driving", "walking": "foot", "cycling": "bike"}.get(
         mode, "driving"
     )
@@ -166,32 +630,26 @@ async def get_route_directions(
 
 @server.register(
     "explore_area",
-    description="Get an overview of points of interest around coordinates",
+    description="Get an overview of the points of interest nearest to coordinates",
 )
 async def explore_area(latitude: float, longitude: float, radius: int = 500) -> dict:
-    query = (
-        f"[out:json][timeout:15];"
-        f"("
-        f'node["amenity"](around:{radius},{latitude},{longitude});'
-        f'node["tourism"](around:{radius},{latitude},{longitude});'
-        f'node["shop"](around:{radius},{latitude},{longitude});'
-        f");"
-        f"out body 20;"
-    )
-    async with httpx.AsyncClient(headers=_HEADERS, timeout=30) as client:
-        resp = await client.post(_OVERPASS, data={"data": query})
-        data = resp.json()
+    coords = _numbers(latitude, longitude, radius)
+    if coords is None:
+        return {"result": {"error": "latitude, longitude and radius must be numbers"}}
+    latitude, longitude, radius = coords
+    index = await _index_around("explore", latitude, longitude, radius)
 
     places = []
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
+    for node, distance in index.nearest(latitude, longitude, 20, radius):
+        tags = node["tags"]
         category = tags.get("amenity") or tags.get("tourism") or tags.get("shop", "")
         places.append(
             {
                 "name": tags.get("name", "Unknown"),
                 "category": category,
-                "lat": el.get("lat"),
-                "lon": el.get("lon"),
+                "lat": node["lat"],
+                "lon": node["lon"],
+                "distance_m": round(distance),
             }
         )
     return {"result": places}
@@ -7,6 +7,8 @@ server = RestServer(
     "Wikipedia REST API for article summaries and search",
     base_url="https://en.wikipedia.org",
     headers={"User-Agent": "ToolUseAPI/0.1"},
+    cache_entries=512,
+    cache_persist=True,
 )
 
 server.get(
@@ -43,3 +45,57 @@ server.get(
     },
     extract="pages",
 )
+
+server.get(
+    "get_extracts",
+    "/w/api.php",
+    description="Get the plain-text introductions of several Wikipedia articles in one call",
+    parameters={
+        "titles": {
+            "type": "array",
+            "required": True,
+            "location": "query",
+            "description": "Article titles (e.g. ['Colosseum', 'Roman Forum'])",
+        },
+    },
+    fixed_params={
+        "action": "query",
+        "prop": "extracts",
+        "exintro": 1,
+        "explaintext": 1,
+        "exlimit": "max",
+        "redirects": 1,
+        "format": "json",
+        "formatversion": 2,
+    },
+    extract="query.pages",
+    batch={"param": "titles", "separator": "|", "max_size": 20},
+)
+
+server.get(
+    "list_category_members",
+    "/w/api.php",
+    description="List the articles in a Wikipedia category",
+    parameters={
+        "cmtitle": {
+            "type": "string",
+            "required": True,
+            "location": "query",
+            "description": "Category title (e.g. 'Category:Roman_amphitheatres')",
+        },
+    },
+    fixed_params={
+        "action": "query",
+        "list": "categorymembers",
+        "cmlimit": 50,
+        "format": "json",
+        "formatversion": 2,
+    },
+    paginate={
+        "type": "cursor",
+        "items": "query.categorymembers",
+        "cursor_path": "continue",
+        "max_items": 50,
+        "max_pages": 10,
+    },
+)